@@ -5,6 +5,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from app.routes.user import user_router
 from app.routes.wsconnect import ws_router
 from app.routes.gmail import gmail_router
+from app.routes.meeting import meeting_router
 from app.utils.token_verify import verify_token
 from app.utils.logger import log_requests
 from app.core.db import Base, engine, get_db
@@ -31,6 +32,7 @@ templates = Jinja2Templates(directory="app/templates")
 
 app.include_router(user_router, prefix="/api")
 app.include_router(gmail_router, prefix="/api")
+app.include_router(meeting_router, prefix="/api")
 app.include_router(ws_router, prefix="/extension")
 
 # @app.get("/")
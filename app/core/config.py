@@ -10,6 +10,43 @@ class Settings(BaseSettings):
     GEMINI_API_KEY:str
     GEMINI_CHAT_MODEL:str
     GEMINI_LIVE_MODEL:str
+    # Concurrent REST calls to the chat model; extra requests wait up to
+    # GEMINI_QUEUE_TIMEOUT seconds for a slot before getting a 503
+    GEMINI_MAX_CONCURRENCY:int=8
+    GEMINI_QUEUE_TIMEOUT:float=2.0
+    # Gemini pacing (0 = unlimited): requests and tokens per minute, retries on
+    # 429/5xx, and how long a call may queue before a 503 (batch items wait longer)
+    GEMINI_RPM:int=1000
+    GEMINI_TPM:int=1000000
+    GEMINI_MAX_RETRIES:int=3
+    GEMINI_MAX_WAIT_SECONDS:float=5.0
+    GEMINI_BATCH_MAX_WAIT_SECONDS:float=60.0
+    GEMINI_TOKEN_ESTIMATE_PER_PART:int=1000
+    # Chat answer cache used by /api/user/{query}?cache=true
+    CHAT_CACHE_MAX_ENTRIES:int=1024
+    CHAT_CACHE_TTL_SECONDS:float=600.0
+    # POST /api/user/batch: queries per request and how many of them run at once
+    CHAT_BATCH_MAX_QUERIES:int=50
+    CHAT_BATCH_MAX_PARALLEL:int=4
+    # Server-side chat sessions: at most CHAT_SESSION_MAX, dropped after CHAT_SESSION_TTL_SECONDS
+    # idle; history beyond CHAT_SESSION_TOKEN_BUDGET is folded into a summary of ~CHAT_SESSION_SUMMARY_TOKENS
+    CHAT_SESSION_MAX:int=1000
+    CHAT_SESSION_TTL_SECONDS:float=1800.0
+    CHAT_SESSION_TOKEN_BUDGET:int=2000
+    CHAT_SESSION_SUMMARY_TOKENS:int=300
+    # File questions: uploads are hashed in UPLOAD_CHUNK_SIZE chunks; files above
+    # UPLOAD_INLINE_MAX_BYTES go through the Gemini Files API once per content hash
+    UPLOAD_CHUNK_SIZE:int=1024 * 1024
+    UPLOAD_INLINE_MAX_BYTES:int=4 * 1024 * 1024
+    GEMINI_FILE_CACHE_SIZE:int=256
+    GEMINI_FILE_TTL_SECONDS:float=46 * 3600
+    GEMINI_FILE_PROCESSING_TIMEOUT:float=60.0
+    # Gemini context caching of large documents (with their system instruction)
+    CONTEXT_CACHE_ENABLED:bool=True
+    CONTEXT_CACHE_MIN_BYTES:int=1024 * 1024
+    CONTEXT_CACHE_TTL_SECONDS:float=3600.0
+    CONTEXT_CACHE_REFRESH_SECONDS:float=600.0
+    CONTEXT_CACHE_MAX_ENTRIES:int=128
 
     DB_NAME:str
     DB_PASSWORD:str
@@ -21,7 +58,71 @@ class Settings(BaseSettings):
     GMAIL_USER:str
     GMAIL_APP_PASSWORD:str
     GMAIL_APP_TOKEN:str
+    # Pooled SMTP connections per Gmail account
+    SMTP_POOL_SIZE:int=2
+    SMTP_IDLE_SECONDS:float=60
+    SMTP_HEALTHCHECK_AFTER_SECONDS:float=5
+    SMTP_MAX_MESSAGES_PER_CONNECTION:int=50
+    SMTP_TIMEOUT_SECONDS:float=30
 
+    # Pub/Sub broker: "local" (single worker) or "shm" (shared memory across workers)
+    BROKER_BACKEND:str="local"
+    BROKER_WORKERS:int=0            # 0 = one worker per CPU core
+    BROKER_SHM_PREFIX:str="aiplayground_broker"
+    BROKER_RING_SIZE:int=4*1024*1024
+
+    # Per-subscriber queue bound and what to do when a subscriber falls behind:
+    # drop_oldest | drop_newest | block | disconnect
+    PUBSUB_QUEUE_SIZE:int=256
+    PUBSUB_OVERFLOW_POLICY:str="drop_oldest"
+    PUBSUB_BLOCK_TIMEOUT:float=1.0
+    # Channels (comma-separated globs) that keep recent messages for late joiners
+    PUBSUB_REPLAY_CHANNELS:str="channel:meeting:*"
+    PUBSUB_REPLAY_SIZE:int=64
+    PUBSUB_REPLAY_MAX_CHANNELS:int=1024
+
+    # In-process key/value store: memory cap in bytes (0 = unlimited) and TTL sweep interval
+    REDIS_MAXMEMORY:int=64*1024*1024
+    REDIS_EXPIRY_INTERVAL:float=1.0
+
+    # Live audio jitter buffer: frame size sent to Gemini, how much audio may queue up,
+    # and what to do past that: catchup (drop oldest) | drop (drop incoming)
+    AUDIO_FRAME_MS:int=100
+    AUDIO_MAX_BUFFER_MS:int=2000
+    AUDIO_OVERFLOW_POLICY:str="catchup"
+
+    # Server-side voice activity detection (per meeting override: ?vad=1&vad_mode=...)
+    VAD_ENABLED:bool=False
+    VAD_MODE:str="drop"             # drop | thin
+    VAD_THRESHOLD_DB:float=-45.0
+    VAD_HANGOVER_MS:int=500
+    VAD_PADDING_MS:int=200
+
+    # Publish live answers token by token (answer_delta) before the final answer
+    LIVE_STREAM_ANSWERS:bool=True
+    # Shared live session per meeting: how long it outlives its last connection,
+    # how many failed reconnects in a row we tolerate, and how long text waits for a session
+    LIVE_SESSION_GRACE_SECONDS:float=30.0
+    LIVE_MAX_RECONNECTS:int=5
+    LIVE_CONNECT_TIMEOUT:float=10.0
+
+    # Live input transcripts: segments are written in batches of TRANSCRIPT_BATCH_SIZE
+    # or every TRANSCRIPT_FLUSH_MS, and the newest meetings are kept in the search index
+    TRANSCRIPT_ENABLED:bool=True
+    TRANSCRIPT_BATCH_SIZE:int=20
+    TRANSCRIPT_FLUSH_MS:int=2000
+    TRANSCRIPT_INDEX_MAX_MEETINGS:int=64
+
+    # WebSocket supervision (0 disables a limit). Dead peers are caught by uvicorn's
+    # protocol-level pings; only clients connecting with ?heartbeat=1 also get an
+    # application {"type": "ping"} every WS_HEARTBEAT_SECONDS, and once they have
+    # answered with {"type": "pong"} they must keep answering within WS_PONG_TIMEOUT_SECONDS.
+    # Paused audio connections are never closed as idle.
+    WS_HEARTBEAT_SECONDS:float=20.0
+    WS_PONG_TIMEOUT_SECONDS:float=20.0
+    WS_AUDIO_IDLE_SECONDS:float=0.0
+    WS_VIEWER_IDLE_SECONDS:float=0.0
+    WS_MAX_CONNECTION_SECONDS:float=14400.0
 
 
     model_config=SettingsConfigDict(
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, Text, DateTime, UniqueConstraint, func
+from app.core.db import Base
+
+
+class MeetingTranscript(Base):
+    __tablename__ = "meeting_transcript"
+    __table_args__ = (UniqueConstraint("meeting_id", "seq", name="uq_meeting_transcript_seq"),)
+
+    id = Column(Integer, primary_key=True, index=True)
+    meeting_id = Column(String, index=True, nullable=False)
+    seq = Column(Integer, nullable=False)   # order of the segment within its meeting
+    text = Column(Text, nullable=False)
+    created_at = Column(DateTime, server_default=func.now(), nullable=False)
+
+    def __repr__(self):
+        return (
+            f"<MeetingTranscript(meeting_id={self.meeting_id}, "
+            f"seq={self.seq}, text={self.text[:30]!r})>"
+        )
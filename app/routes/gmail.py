@@ -1,5 +1,5 @@
 from fastapi import APIRouter, UploadFile, Header, Form, HTTPException
-from fastapi.responses import JSONResponse
+from app.utils.json_codec import JSONResponse
 from typing import List, Optional
 from app.services.gmail_client import GmailSender
 from app.core.config import settings
@@ -0,0 +1,79 @@
+from fastapi import APIRouter, Query
+from app.utils.json_codec import JSONResponse
+from app.services.transcripts import transcripts
+from app.services.live_sessions import live_sessions
+from app.services.connections import connections
+
+
+meeting_router = APIRouter(tags=["Meeting"], prefix="/meeting")
+
+
+@meeting_router.get("/live")
+async def live_meetings():
+    """
+    List the live meetings of this worker with their Gemini session, audio queue
+    and WebSocket connection stats (queue depths, bytes in/out, ages)
+    """
+    meetings = {}
+    for meeting_id, meeting in live_sessions.sessions.items():
+        meetings[meeting_id] = {**meeting.snapshot(), "sockets": []}
+    others = []
+    for conn in connections.snapshot():
+        meeting_id = conn["meeting_id"]
+        if meeting_id is None:
+            others.append(conn)
+            continue
+        entry = meetings.setdefault(meeting_id, {"meeting_id": meeting_id, "sockets": []})
+        entry["sockets"].append(conn)
+    return JSONResponse(
+        status_code=200,
+        content={
+            "status_code": 200,
+            "message": {"meetings": list(meetings.values()), "monitors": others},
+        },
+    )
+
+
+@meeting_router.get("/{meeting_id}/transcript")
+async def get_transcript(meeting_id: str):
+    """
+    Return the stored transcript segments of a meeting, in order
+    """
+    try:
+        segments = await transcripts.segments(meeting_id)
+        return JSONResponse(
+            status_code=200,
+            content={"status_code": 200, "message": segments},
+        )
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={
+                "status_code": 500,
+                "message": "Error while loading the transcript",
+                "error": str(e),
+            },
+        )
+
+
+@meeting_router.get("/{meeting_id}/transcript/search")
+async def search_transcript(meeting_id: str, q: str = Query(...), limit: int = Query(10, ge=1, le=100)):
+    """
+    Keyword search over a meeting's transcript, answered from the local index
+    without a model round-trip
+    """
+    try:
+        results = await transcripts.search(meeting_id, q, limit=limit)
+        return JSONResponse(
+            status_code=200,
+            content={"status_code": 200, "message": results},
+        )
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={
+                "status_code": 500,
+                "message": "Error while searching the transcript",
+                "error": str(e),
+            },
+        )
@@ -1,47 +1,399 @@
+import asyncio
+from typing import List, Optional
 from fastapi import APIRouter,UploadFile,File,Query
-from fastapi.responses import JSONResponse
-from app.services.gemini_client import google_client,GeminiResponse
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from app.utils.json_codec import JSONResponse, dumps
+from app.services.gemini_client import google_client,GeminiResponse,chat_limiter,chat_cache
 from app.core.config import settings
-from google.genai.types import Part, GenerateContentConfig
+from app.utils.cache import cache_key
+from app.utils.limiter import CapacityError
+from app.services.uploads import file_part
+from app.services.context_cache import context_caches
+from app.services.chat_sessions import chat_sessions
+from app.services.scheduler import Priority, estimate_tokens, gemini_scheduler, RETRYABLE_CODES
+from google.genai import errors
+from google.genai.types import Content, Part, GenerateContentConfig
 
 
 
 user_router = APIRouter(tags=["User"], prefix="/user")
 
-@user_router.get("/{query}")
-async def get_query(query: str):
+
+class BatchRequest(BaseModel):
+    queries: List[str] = Field(..., min_length=1)
+    cache: bool = False
+
+# Built once; the configs are the same for every request
+CHAT_CONFIG = GenerateContentConfig(
+    temperature=1.0,
+    top_k=40,      # must be int
+    top_p=0.95,
+    response_schema=GeminiResponse,
+    response_mime_type="application/json",
+    system_instruction="You are a chatbot"
+)
+FILE_CONFIG = GenerateContentConfig(
+    temperature=1.0,
+    top_k=40,      # must be int
+    top_p=0.95,
+    response_schema=GeminiResponse,
+    response_mime_type="application/json",
+    system_instruction="You are a chatbot follow user query"
+)
+
+# Everything besides the query that decides a chat answer
+CHAT_CACHE_SCOPE = cache_key(settings.GEMINI_CHAT_MODEL, CHAT_CONFIG.model_dump(exclude_none=True))
+
+
+async def generate(contents, config, priority=Priority.INTERACTIVE):
+    """
+    Calls the chat model without blocking the event loop, so live audio keeps
+    flowing while it runs. The call is paced (and retried when throttled) by the
+    shared scheduler; raises CapacityError when it can't get through in time.
+    """
+    async def attempt():
+        async with chat_limiter.slot():
+            return await google_client.aio.models.generate_content(
+                model=settings.GEMINI_CHAT_MODEL,
+                config=config,
+                contents=contents,
+            )
+
+    return await gemini_scheduler.call(attempt, priority, estimate_tokens(contents))
+
+
+async def ask(query, priority=Priority.INTERACTIVE, contents=None):
+    """
+    The model's answer to `query` as a dict, or None if Gemini returned no candidates.
+    `contents` replaces the plain query, e.g. with a session's history around it.
+    """
+    response = await generate(
+        contents or [Part.from_text(text=query)],   # ✅ use actual query
+        CHAT_CONFIG,
+        priority,
+    )
+    if not response.candidates:
+        return None
+    # Use instantiated objects.
+    response_data: GeminiResponse = response.parsed
+    return response_data.model_dump()
+
+
+async def answer(query, cache=False, priority=Priority.INTERACTIVE):
+    """ask(), going through the chat cache when `cache` is set."""
+    if not cache:
+        return await ask(query, priority)
+    key = cache_key(CHAT_CACHE_SCOPE, " ".join(query.split()).casefold())
+    return await chat_cache.get_or_compute(key, lambda: ask(query, priority))
+
+
+async def file_request(file, query, config):
+    """
+    Contents and config for a question about an uploaded file. Large documents
+    are put in a Gemini context cache together with the system instruction, so
+    follow-up questions on the same document only send the question.
+    """
+    document, digest, size = await file_part(file)
+    if settings.CONTEXT_CACHE_ENABLED and size >= settings.CONTEXT_CACHE_MIN_BYTES:
+        name = await context_caches.get(
+            f"file:{digest}",
+            cache_key(settings.GEMINI_CHAT_MODEL, config.system_instruction),
+            settings.GEMINI_CHAT_MODEL,
+            contents=[Content(role="user", parts=[document])],
+            system_instruction=config.system_instruction,
+        )
+        if name:
+            # The cached content already holds the system instruction
+            cached_config = config.model_copy(update={"cached_content": name, "system_instruction": None})
+            return [Part.from_text(text=query)], cached_config
+    return [document, Part.from_text(text=query)], config
+
+
+def sse(event, data):
+    return f"event: {event}\ndata: {dumps(data)}\n\n"
+
+
+async def stream_answer(contents, config):
     """
-    Call Gemini chat model with the given query
+    Server-sent events for one streamed Gemini call: `delta` events with the raw
+    text as it is generated, then one `answer` event with the validated
+    GeminiResponse (or an `error` event). Raises CapacityError before the first
+    event if the scheduler or the limiter can't fit it in. Closing the generator
+    (the client went away) closes the upstream stream.
     """
+    tokens = estimate_tokens(contents)
+    await gemini_scheduler.admit(Priority.INTERACTIVE, tokens)
+    async with chat_limiter.slot():
+        # Sent as soon as we hold a slot, so the caller can answer with a 503 otherwise
+        yield ": started\n\n"
+        parts = []
+        usage = None
+        try:
+            stream = await google_client.aio.models.generate_content_stream(
+                model=settings.GEMINI_CHAT_MODEL,
+                config=config,
+                contents=contents,
+            )
+            try:
+                async for chunk in stream:
+                    if chunk.usage_metadata is not None:
+                        usage = chunk
+                    text = chunk.text
+                    if text:
+                        parts.append(text)
+                        yield sse("delta", {"text": text})
+            finally:
+                aclose = getattr(stream, "aclose", None)
+                if aclose is not None:
+                    await aclose()
+            if usage is not None:
+                gemini_scheduler.record_usage(tokens, usage)
+
+            if not parts:
+                yield sse("error", {"status_code": 400, "message": "No response from Gemini"})
+                return
+            response_data = GeminiResponse.model_validate_json("".join(parts))
+            yield sse("answer", {"status_code": 200, "message": response_data.model_dump()})
+        except Exception as e:
+            if isinstance(e, errors.APIError) and e.code in RETRYABLE_CODES:
+                gemini_scheduler.backoff(e)
+            yield sse("error", {
+                "status_code": 500,
+                "message": "Error while fetching from Gemini",
+                "error": str(e),
+            })
+
+
+async def sse_response(events):
+    """Starts streaming `events`, or returns a 503 if no Gemini slot is free."""
     try:
-        response = google_client.models.generate_content(
-            model=settings.GEMINI_CHAT_MODEL,
-            config=GenerateContentConfig(
-                temperature=1.0,
-                top_k=40,      # must be int
-                top_p=0.95,
-                response_schema=GeminiResponse,
-                response_mime_type="application/json",
-                system_instruction="You are a chatbot"
-            ),
-            contents=[Part.from_text(text=query)],   # ✅ use actual query
+        first = await events.__anext__()
+    except CapacityError:
+        return busy_response()
+
+    async def body():
+        yield first
+        async for event in events:
+            yield event
+
+    return StreamingResponse(
+        body(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def busy_response():
+    return JSONResponse(
+        status_code=503,
+        content={"status_code": 503, "message": "Gemini is busy, please retry shortly"},
+        headers={"Retry-After": str(max(1, round(settings.GEMINI_QUEUE_TIMEOUT)))},
+    )
+
+
+def sessions_unavailable():
+    return JSONResponse(
+        status_code=501,
+        content={
+            "status_code": 501,
+            "message": "Chat sessions need a single worker (BROKER_BACKEND=local or BROKER_WORKERS=1)",
+        },
+    )
+
+
+@user_router.get("/cache/stats")
+async def cache_stats():
+    """
+    Hit/miss/eviction counters of the chat answer cache
+    """
+    return JSONResponse(
+        status_code=200,
+        content={"status_code": 200, "message": chat_cache.stats()},
+    )
+
+
+@user_router.post("/batch")
+async def batch_query(request: BatchRequest):
+    """
+    Answer several queries in one request. Up to CHAT_BATCH_MAX_PARALLEL run at a
+    time (and every Gemini call still takes a slot of the shared limiter);
+    results stream back as NDJSON lines in completion order, each tagged with
+    the index of its query and carrying its own status_code.
+    """
+    if len(request.queries) > settings.CHAT_BATCH_MAX_QUERIES:
+        return JSONResponse(
+            status_code=400,
+            content={
+                "status_code": 400,
+                "message": f"At most {settings.CHAT_BATCH_MAX_QUERIES} queries per batch",
+            },
         )
 
-        if not response.candidates:
+    parallel = asyncio.Semaphore(settings.CHAT_BATCH_MAX_PARALLEL)
+
+    async def run(index, query):
+        async with parallel:
+            try:
+                # Batch items yield to interactive and live calls when the quota is short
+                message = await answer(query, request.cache, Priority.BATCH)
+                if message is None:
+                    return {"index": index, "status_code": 400, "message": "No response from Gemini"}
+                return {"index": index, "status_code": 200, "message": message}
+            except CapacityError:
+                return {"index": index, "status_code": 503, "message": "Gemini is busy, please retry shortly"}
+            except Exception as e:
+                return {
+                    "index": index,
+                    "status_code": 500,
+                    "message": "Error while fetching from Gemini",
+                    "error": str(e),
+                }
+
+    async def results():
+        tasks = [asyncio.create_task(run(index, query)) for index, query in enumerate(request.queries)]
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                yield dumps(await next_done) + "\n"
+        finally:
+            # The client went away: stop whatever is still queued or running
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
+
+
+@user_router.get("/stream/{query}")
+async def stream_query(query: str):
+    """
+    Stream the chat model's answer to the given query as server-sent events
+    """
+    return await sse_response(stream_answer(
+        [Part.from_text(text=query)],
+        CHAT_CONFIG,
+    ))
+
+
+@user_router.get("/cache/context")
+async def context_cache_stats():
+    """
+    Gemini context caches in use, with hit and refresh counts per key
+    """
+    return JSONResponse(
+        status_code=200,
+        content={"status_code": 200, "message": context_caches.stats()},
+    )
+
+
+@user_router.get("/scheduler/stats")
+async def scheduler_stats():
+    """
+    Gemini scheduler state and queue-wait metrics per priority class
+    """
+    return JSONResponse(
+        status_code=200,
+        content={"status_code": 200, "message": gemini_scheduler.stats()},
+    )
+
+
+async def answer_in_session(session, query):
+    """Answers `query` with the session's history and records the turn."""
+    async with session.lock:
+        message = await ask(query, contents=chat_sessions.contents(session, query))
+        if message is not None:
+            chat_sessions.record(session, query, message["message"])
+        return message
+
+
+@user_router.post("/session")
+async def create_session():
+    """
+    Start a server-side chat session; pass its id as ?session_id= to /user/{query}
+    """
+    if not chat_sessions.enabled:
+        return sessions_unavailable()
+    session = chat_sessions.create()
+    return JSONResponse(
+        status_code=200,
+        content={"status_code": 200, "message": {"session_id": session.id}},
+    )
+
+
+@user_router.get("/session/{session_id}")
+async def get_session(session_id: str):
+    """
+    Size and summary of a chat session
+    """
+    if not chat_sessions.enabled:
+        return sessions_unavailable()
+    session = chat_sessions.get(session_id)
+    if session is None:
+        return JSONResponse(
+            status_code=404,
+            content={"status_code": 404, "message": "Chat session not found or expired"},
+        )
+    return JSONResponse(
+        status_code=200,
+        content={"status_code": 200, "message": session.snapshot()},
+    )
+
+
+@user_router.delete("/session/{session_id}")
+async def delete_session(session_id: str):
+    """
+    End a chat session and drop its history
+    """
+    if not chat_sessions.enabled:
+        return sessions_unavailable()
+    if not chat_sessions.delete(session_id):
+        return JSONResponse(
+            status_code=404,
+            content={"status_code": 404, "message": "Chat session not found or expired"},
+        )
+    return JSONResponse(
+        status_code=200,
+        content={"status_code": 200, "message": "Chat session deleted"},
+    )
+
+
+@user_router.get("/{query}")
+async def get_query(query: str, cache: bool = Query(False), session_id: Optional[str] = Query(None)):
+    """
+    Call Gemini chat model with the given query.
+    With ?cache=true a recent answer to the same (whitespace/case-normalized)
+    query is reused, and identical concurrent requests share one Gemini call.
+    With ?session_id= the query continues that chat session: the server adds
+    the conversation so far (recent turns plus a summary of older ones), so
+    the client only sends the new query. Session answers are never cached.
+    """
+    try:
+        if session_id:
+            if not chat_sessions.enabled:
+                return sessions_unavailable()
+            session = chat_sessions.get(session_id)
+            if session is None:
+                return JSONResponse(
+                    status_code=404,
+                    content={"status_code": 404, "message": "Chat session not found or expired"},
+                )
+            message = await answer_in_session(session, query)
+        else:
+            message = await answer(query, cache)
+
+        if message is None:
             return JSONResponse(
                 status_code=400,
                 content={"status_code": 400, "message": "No response from Gemini"},
             )
 
-        # Use instantiated objects.
-        response_data: GeminiResponse = response.parsed
-
-        
         return JSONResponse(
             status_code=200,
-            content={"status_code": 200, "message": response_data.model_dump()},
+            content={"status_code": 200, "message": message},
         )
 
+    except CapacityError:
+        return busy_response()
     except Exception as e:
         return JSONResponse(
             status_code=500,
@@ -53,23 +405,31 @@ async def get_query(query: str):
         )
 
 
+@user_router.post("/file/stream")
+async def fileupload_stream(file:UploadFile=File(...),query=Query(...)):
+    """
+    Stream the answer about an uploaded file as server-sent events
+    """
+    try:
+        contents, config = await file_request(file, query, FILE_CONFIG)
+    except Exception as e:
+        return JSONResponse(
+            status_code=500,
+            content={
+                "status_code": 500,
+                "message": "Error while uploading the file to Gemini",
+                "error": str(e),
+            },
+        )
+    return await sse_response(stream_answer(contents, config))
+
+
 @user_router.post("/file")
 async def fileupload(file:UploadFile=File(...),query=Query(...)):
-    content_type=file.content_type
-    data=await file.read()
     try:
-        response = google_client.models.generate_content(
-            model=settings.GEMINI_CHAT_MODEL,
-            config=GenerateContentConfig(
-                temperature=1.0,
-                top_k=40,      # must be int
-                top_p=0.95,
-                response_schema=GeminiResponse,
-                response_mime_type="application/json",
-                system_instruction="You are a chatbot follow user query"
-            ),
-            contents=[Part.from_bytes(data=data,mime_type=content_type),Part.from_text(text=query)],   # ✅ use actual query
-        )
+        # Large files are uploaded to Gemini once and referenced (or context cached) afterwards
+        contents, config = await file_request(file, query, FILE_CONFIG)
+        response = await generate(contents, config)
 
         if not response.candidates:
             return JSONResponse(
@@ -86,6 +446,8 @@ async def fileupload(file:UploadFile=File(...),query=Query(...)):
             content={"status_code": 200, "message": response_data.model_dump()},
         )
 
+    except CapacityError:
+        return busy_response()
     except Exception as e:
         return JSONResponse(
             status_code=500,
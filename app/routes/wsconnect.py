@@ -1,11 +1,39 @@
 from fastapi import APIRouter,WebSocket,WebSocketDisconnect
 from app.services.redis_client import redis_client
-from app.services.gemini_client import google_client
-import asyncio,json,base64
+from app.services.live_sessions import live_sessions
+from app.services.connections import connections
+import base64
 from app.core.config import settings
+from app.utils.json_codec import dumps, loads
+from app.utils.audio import JitterBuffer, PcmConverter, audio_payload
+from app.utils.vad import VoiceActivityDetector
+from app.utils.tasks import run_until_first_done
 
 ws_router = APIRouter(tags=["Live list"], prefix="/ws")
 
+
+def _query_number(query_params, name, default, cast=int):
+    """A numeric query param, or `default` when it is missing or malformed."""
+    try:
+        return cast(query_params.get(name, default))
+    except (TypeError, ValueError):
+        print(f"⚠ Ignoring invalid {name}: {query_params.get(name)!r}")
+        return default
+
+
+def _vad_from_query(query_params):
+    """Builds the per-meeting VAD from ?vad=1&vad_mode=&vad_threshold_db=&vad_hangover_ms=&vad_padding_ms="""
+    enabled = query_params.get("vad", "1" if settings.VAD_ENABLED else "0")
+    if enabled.lower() not in ("1", "true", "yes", "on"):
+        return None
+    return VoiceActivityDetector(
+        threshold_db=_query_number(query_params, "vad_threshold_db", settings.VAD_THRESHOLD_DB, float),
+        hangover_ms=_query_number(query_params, "vad_hangover_ms", settings.VAD_HANGOVER_MS),
+        padding_ms=_query_number(query_params, "vad_padding_ms", settings.VAD_PADDING_MS),
+        mode=query_params.get("vad_mode", settings.VAD_MODE),
+    )
+
+
 @ws_router.websocket("/stream/chat/{meeting_id}/")
 async def receive_updates(websocket: WebSocket, meeting_id: str):
     print(f"📡 WebSocket connection recived for meeting: {meeting_id}")
@@ -14,74 +42,110 @@ async def receive_updates(websocket: WebSocket, meeting_id: str):
     print(f"📡 WebSocket connected for meeting: {meeting_id}")
     channel_id=f"channel:meeting:{meeting_id}"
 
-    # Subscribe to Redis channel (for sync Redis client)
+    # Late joiners can catch up: ?last_seq=<id> resumes after the last message seen,
+    # ?replay_seconds=<n> replays the recent window
+    last_seq = websocket.query_params.get("last_seq")
+    replay_seconds = websocket.query_params.get("replay_seconds")
+    try:
+        after_seq = int(last_seq) if last_seq else None
+        replay_seconds = float(replay_seconds) if replay_seconds else None
+    except ValueError:
+        print(f"⚠ Invalid replay params for meeting {meeting_id}: last_seq={last_seq!r}, replay_seconds={replay_seconds!r}")
+        await websocket.close(code=1008, reason="last_seq must be an integer and replay_seconds a number")
+        return
+
+    # Subscribe to the in-process broker channel
     pubsub = redis_client.pubsub()
-    await asyncio.to_thread(pubsub.subscribe, channel_id)
+    pubsub.subscribe(channel_id, after_seq=after_seq, replay_seconds=replay_seconds)
     print(f"✅ Subscribed to Redis channel: {channel_id}")
 
-    connected = True
-
-    async def listen_to_redis():
+    async def listen_to_redis(conn):
         """Listen for messages from Redis and send to WebSocket"""
         try:
-            while connected:
-                # Get message from Redis (sync call in thread)
-                message = await asyncio.to_thread(
-                    pubsub.get_message,
-                    timeout=1.0
-                )
-                if message and message["type"] == "message":
+            # Wakes up only when a message is delivered to our queue
+            async for message in pubsub.listen():
+                if message["type"] == "disconnect":
+                    # We fell too far behind the meeting; let the client reconnect
+                    print(f"⚠ Viewer too slow, closing WebSocket for meeting: {meeting_id}")
+                    await websocket.close(code=1013)
+                    break
+                if message["type"] == "message":
                     try:
-                        data = json.loads(message["data"])
-                        await websocket.send_json(data)
+                        # Pre-encoded once by the broker (with its seq) for every viewer
+                        await conn.send_text(message["frame"])
                         # print(f"📤 Sent Redis message to WebSocket: {data}")
                     except Exception as e:
                         print(f"⚠ Failed to send Redis message to WebSocket: {e}")
-                await asyncio.sleep(0.01)
         except Exception as e:
             print(f"Error in Redis listener: {e}")
 
-    async def listen_to_websocket():
+    async def listen_to_websocket(conn):
         """Listen for messages from WebSocket and publish to Redis"""
-        nonlocal connected
         try:
-            while connected:
-                # Receive message from WebSocket
-                message = await websocket.receive_json()
+            while True:
+                # Receive message from WebSocket (heartbeat pongs are consumed by the supervisor)
+                text = await conn.receive_text()
+                message = loads(text)
                 print(f"📥 Received message from WebSocket: {message}")
                 
-                # Publish to Redis (sync call in thread)
+                # Publish the client's own encoding to the broker (non-blocking, in-process)
                 if message:
-                    await asyncio.to_thread(
-                        redis_client.publish,
-                        channel_id,
-                        json.dumps(message)
-                    )
+                    redis_client.publish(channel_id, text)
                     # print(f"✅ Published WebSocket message to Redis: {message}")
         except WebSocketDisconnect:
-            connected = False
             print(f"❌ WebSocket disconnected: {meeting_id}")
         except Exception as e:
-            connected = False
             print(f"Error in WebSocket listener: {e}")
 
     try:
-        # Run both listeners concurrently
-        await asyncio.gather(
-            listen_to_redis(),
-            listen_to_websocket(),
-            return_exceptions=True
-        )
+        async with connections.supervise(websocket, "chat", meeting_id) as conn:
+            conn.pubsub = pubsub
+            # Whichever side ends first (disconnect, slow viewer, idle or dead client) stops the others
+            await run_until_first_done(listen_to_redis(conn), listen_to_websocket(conn), conn.watch())
     except Exception as e:
         print(f"Error in WebSocket handler: {e}")
     finally:
-        connected = False
-        # Clean up Redis connection (sync calls in thread)
-        await asyncio.to_thread(pubsub.unsubscribe, f"channel:meeting:{meeting_id}")
-        await asyncio.to_thread(pubsub.close)
+        # Clean up broker subscription
+        pubsub.unsubscribe(channel_id)
+        pubsub.close()
         print(f"✅ Cleaned up Redis connection for meeting: {meeting_id}")    
 
 
+@ws_router.websocket("/monitor/")
+async def monitor_meetings(websocket: WebSocket):
+    """Streams every meeting channel matching `pattern` (default all meetings) to one socket."""
+    pattern = websocket.query_params.get("pattern", "channel:meeting:*")
+    await websocket.accept()
+    print(f"📊 Monitor connected for pattern: {pattern}")
+
+    pubsub = redis_client.pubsub()
+    pubsub.psubscribe(pattern)
+
+    async def forward(conn):
+        async for message in pubsub.listen():
+            if message["type"] == "disconnect":
+                await websocket.close(code=1013)
+                break
+            if message["type"] == "pmessage":
+                data = message["data"]
+                if isinstance(data, bytes):
+                    # Byte payloads (shm KIND_BYTES) are still JSON text, just not decoded
+                    data = data.decode("utf-8")
+                # Wrap the already encoded message instead of decoding and re-encoding it
+                await conn.send_text(f'{{"channel":{dumps(message["channel"])},"data":{data}}}')
+
+    try:
+        async with connections.supervise(websocket, "monitor") as conn:
+            conn.pubsub = pubsub
+            # Reading the socket is what notices the client going away
+            await run_until_first_done(forward(conn), conn.drain(), conn.watch())
+        print(f"❌ Monitor disconnected for pattern: {pattern}")
+    except Exception as e:
+        print(f"Error in monitor WebSocket: {e}")
+    finally:
+        pubsub.close()
+
+
 @ws_router.websocket("/stream/{meeting_id}/")
 async def stream_audio(websocket: WebSocket, meeting_id: str):
     # Extract system_instruction from query param if available
@@ -110,58 +174,54 @@ async def stream_audio(websocket: WebSocket, meeting_id: str):
     await websocket.accept()
     print(f"🔌 WebSocket connected for meeting: {meeting_id}")
     channel_id=f"channel:meeting:{meeting_id}"
-    
-    # Create Redis pubsub object
-    pubsub = redis_client.pubsub()
-    pubsub.subscribe(channel_id)
 
     try:
-        pcm_queue = asyncio.Queue()
-        session_active = True
+        vad = _vad_from_query(query_params)
+        # Client audio format is negotiated once: ?sample_rate=48000&channels=2&encoding=f32le
+        converter = PcmConverter(
+            sample_rate=int(query_params.get("sample_rate", 16000)),
+            channels=int(query_params.get("channels", 1)),
+            encoding=query_params.get("encoding", "s16le"),
+        )
+    except ValueError as e:
+        print(f"⚠ Invalid audio params for meeting {meeting_id}: {e}")
+        await websocket.close(code=1008, reason=str(e))
+        return
+    # ?stream_answers=0 publishes only the final answer of each turn
+    stream_answers = query_params.get(
+        "stream_answers", "1" if settings.LIVE_STREAM_ANSWERS else "0"
+    ).lower() in ("1", "true", "yes", "on")
 
-        async def receive_redis_messages(session):
-            """Receive messages from Redis and forward to Gemini session"""
-            while session_active:
-                try:
-                    # Use non-blocking message check with async sleep
-                    message = pubsub.get_message()
-                    if message and message['type'] == 'message':
-                        data = json.loads(message['data'])
-                        print(f"📥 Received message from Redis: {data}")
-                        
-                        msg_type = data.get("type", "")
-                        
-                        if msg_type == "query":
-                            prompt = data.get("text", "")
-                            if prompt:
-                                await session.send(input=prompt, end_of_turn=True)
-                                # print(f"📤 Sent query to Gemini: {prompt[:50]}...")
-                                
-                        elif msg_type == "close":
-                            print(f"🔌 Closing WebSocket connection for meeting: {meeting_id}")
-                            break
-                            
-                    # Small sleep to prevent busy waiting
-                    await asyncio.sleep(0.1)
-                    
-                except asyncio.CancelledError:
-                    break
-                except Exception as e:
-                    print(f"⚠ Redis message error: {e}")
-                    await asyncio.sleep(0.1)
+    def new_buffer():
+        # Coalesces client chunks into ?frame_ms= frames and caps how far audio can back up
+        return JitterBuffer(
+            frame_ms=_query_number(query_params, "frame_ms", settings.AUDIO_FRAME_MS),
+            max_ms=settings.AUDIO_MAX_BUFFER_MS,
+            policy=settings.AUDIO_OVERFLOW_POLICY,
+        )
 
-        async def receive_messages():
-            """Receives JSON and puts audio chunks into PCM queue."""
+    try:
+        async def receive_messages(meeting, conn):
+            """
+            Receives audio and control messages from the client.
+            Binary frames carry PCM (optionally behind an AUD0 header) and are copied
+            straight into the meeting's PCM buffer; text frames are JSON control
+            messages, plus the legacy base64 {"type": "audio"} form.
+            """
             while True:
                 try:
-                    data = await websocket.receive_json()
+                    message = await conn.receive()
+                    if message.get("bytes") is not None:
+                        meeting.buffer.write(converter.convert(audio_payload(message["bytes"])))
+                        continue
+
+                    data = loads(message["text"])
                     msg_type = data.get("type")
 
                     if msg_type == "audio":
                         b64data = data.get("data")
                         if b64data:
-                            pcm_data = base64.b64decode(b64data)
-                            await pcm_queue.put(pcm_data)
+                            meeting.buffer.write(converter.convert(base64.b64decode(b64data)))
                     elif msg_type == "text":
                         text = data.get("text", "")
                         if not text:
@@ -172,15 +232,19 @@ async def stream_audio(websocket: WebSocket, meeting_id: str):
                                 f"The question is: {text.strip()} \n Provide a concise answer based on the audio content heard so far."
                             )
                         end_of_turn = data.get("end_of_turn", False)
-                        await session.send(input=prompt, end_of_turn=end_of_turn)
-                        
+                        try:
+                            await meeting.send_text(prompt, end_of_turn=end_of_turn)
+                        except Exception as e:
+                            print(f"⚠ Failed to send text to Gemini: {e}")
+
                     elif msg_type == "pause":
                         print("⏸ Received pause message")
+                        conn.paused = True
                         # Synchronous Redis publish
                         try:
                             redis_client.publish(
                                 channel_id,
-                                json.dumps({
+                                dumps({
                                     "type": "pause",
                                     "text": "Transcription paused."
                                 })
@@ -190,94 +254,39 @@ async def stream_audio(websocket: WebSocket, meeting_id: str):
 
                     elif msg_type == "resume":
                         print("▶ Received resume message")
+                        conn.paused = False
                         try:
                             redis_client.publish(
                                 channel_id,
-                                json.dumps({
+                                dumps({
                                     "type": "resume",
                                     "text": "Transcription resumed."
                                 })
                             )
                         except Exception as e:
                             print(f"⚠ Failed to publish resume message: {e}")
-                    
+
                     else:
                         print("⚠ Unknown message type:", msg_type)
 
                 except WebSocketDisconnect:
+                    # The meeting session publishes "close" once its grace period runs out
                     print(f"❌ WebSocket disconnected: {meeting_id}")
-                    # Synchronous Redis publish
-                    redis_client.publish(
-                        channel_id,
-                        json.dumps({
-                            "type": "close",
-                            "message": "Manager has closed the connection."
-                        })
-                    )
                     break
                 except Exception as e:
                     print(f"⚠ Error receiving message: {e}")
                     break
 
-        async def audio_stream():
-            """Yields PCM data chunks for Gemini start_stream()."""
-            while True:
-                chunk = await pcm_queue.get()
-                yield chunk
-                pcm_queue.task_done()
-
-        async with google_client.aio.live.connect(model=settings.GEMINI_LIVE_MODEL, config=config) as session:
-            print(f"🎤 Gemini session started for meeting: {meeting_id}")
-            
-            # Send initial system instruction
-            # await session.send(input=system_instruction)
-
-            # Start tasks
-            stream_task = asyncio.create_task(receive_messages())
-            redis_task = asyncio.create_task(receive_redis_messages(session=session))
-            buffer = ""
-
-            # Start Gemini stream
-            async for response in session.start_stream(
-                stream=audio_stream(),
-                mime_type="audio/pcm"
-            ):
-                if response.text:
-                    buffer += response.text
-
-                    if "|end|" in buffer:
-                        # Extract complete response and strip the marker
-                        final_text = buffer.replace("|end|", "").strip()
+        # Every connection of this meeting shares one Gemini Live session
+        async with live_sessions.attach(
+            meeting_id, config, new_buffer, vad=vad, stream_answers=stream_answers
+        ) as meeting:
+            print(f"🎤 Joined Gemini session for meeting: {meeting_id} ({meeting.refs} connection(s))")
+            async with connections.supervise(websocket, "audio", meeting_id) as conn:
+                # Client disconnect, an idle or dead client, or the meeting session giving up ends this connection
+                await run_until_first_done(receive_messages(meeting, conn), meeting.closed.wait(), conn.watch())
 
-                        # Synchronous Redis publish
-                        redis_client.publish(
-                            channel_id,
-                            json.dumps({
-                                "type": "answer",
-                                "text": final_text
-                            })
-                        )
-                        print(f"📤 Published answer to Redis: {final_text[:50]}...")
-                        buffer = ""  # Reset for the next message
-            
-            # Wait for tasks to complete
-            session_active = False
-            await stream_task
-            await redis_task
-            
     except WebSocketDisconnect:
         print(f"❌ WebSocket disconnected in Live: {meeting_id}")
-        # Synchronous Redis publish
-        redis_client.publish(
-            channel_id,
-            json.dumps({
-                "type": "close",
-                "message": "Manager has closed the connection."
-            })
-        )
     except Exception as e:
         print(f"⚠ Gemini session error for meeting {meeting_id}: {e}")
-    finally:
-        # Cleanup Redis subscription
-        pubsub.unsubscribe(f"channel:meeting:{meeting_id}")
-        pubsub.close()
\ No newline at end of file
@@ -0,0 +1,206 @@
+import asyncio
+import time
+import uuid
+from collections import OrderedDict, deque
+
+from google.genai.types import Content, GenerateContentConfig, Part
+
+from app.core.config import settings
+from app.services.gemini_client import google_client
+from app.services.redis_client import broker_worker_count
+from app.services.scheduler import Priority, gemini_scheduler
+
+
+def estimate_text_tokens(text):
+    return len(text) // 4 + 1
+
+
+SUMMARY_CONFIG = GenerateContentConfig(
+    temperature=0.2,
+    system_instruction=(
+        "You maintain a running summary of a chat between a user and an assistant. "
+        "Merge the earlier summary and the new turns into one short summary that keeps "
+        "names, facts, decisions and open questions. Reply with the summary only."
+    ),
+)
+
+
+async def summarize_with_gemini(summary, turns, max_tokens):
+    """Folds `turns` into `summary` with the chat model, as low-priority work."""
+    lines = [f"Earlier summary: {summary or '(none)'}", "New turns:"]
+    for user_text, model_text, _ in turns:
+        lines.append(f"User: {user_text}")
+        lines.append(f"Assistant: {model_text}")
+    lines.append(f"Keep the summary under {max_tokens * 3 // 4} words.")
+    contents = [Part.from_text(text="\n".join(lines))]
+
+    async def attempt():
+        return await google_client.aio.models.generate_content(
+            model=settings.GEMINI_CHAT_MODEL,
+            config=SUMMARY_CONFIG,
+            contents=contents,
+        )
+
+    tokens = estimate_text_tokens(summary) + sum(turn[2] for turn in turns)
+    response = await gemini_scheduler.call(attempt, Priority.BATCH, tokens)
+    return (response.text or "").strip()
+
+
+class ChatSession:
+    """
+    Server-held history of one conversation: a summary of older turns plus the
+    newest turns that fit in the token budget.
+    """
+    def __init__(self, session_id):
+        self.id = session_id
+        self.turns = deque()          # (user text, model text, estimated tokens)
+        self.window_tokens = 0
+        self.summary = ""
+        self.unsummarized = []        # trimmed turns not folded into the summary yet
+        self.turn_count = 0
+        self.created_at = time.time()
+        self.touched_at = time.monotonic()
+        self.lock = asyncio.Lock()    # one turn at a time, so history stays in order
+        self.summarizing = None
+
+    def context(self, limit):
+        """The summary, followed by a clipped excerpt of turns still waiting to be folded in."""
+        text = " ".join(
+            [self.summary] + [
+                f"User asked: {user_text} Assistant said: {model_text}"
+                for user_text, model_text, _ in self.unsummarized
+            ]
+        ).strip()
+        return text if len(text) <= limit else "…" + text[-limit:]
+
+    def contents(self, query, summary_chars):
+        """The request contents for a new `query`: summary, recent turns, then the query."""
+        contents = []
+        context = self.context(summary_chars)
+        if context:
+            contents.append(Content(role="user", parts=[Part.from_text(text=f"Summary of our conversation so far: {context}")]))
+            contents.append(Content(role="model", parts=[Part.from_text(text="Understood.")]))
+        for user_text, model_text, _ in self.turns:
+            contents.append(Content(role="user", parts=[Part.from_text(text=user_text)]))
+            contents.append(Content(role="model", parts=[Part.from_text(text=model_text)]))
+        contents.append(Content(role="user", parts=[Part.from_text(text=query)]))
+        return contents
+
+    def snapshot(self):
+        return {
+            "session_id": self.id,
+            "turns": self.turn_count,
+            "window_turns": len(self.turns),
+            "window_tokens": self.window_tokens,
+            "summary": self.summary,
+            "unsummarized_turns": len(self.unsummarized),
+        }
+
+
+class ChatSessionStore:
+    """
+    Chat sessions by id, evicted least-recently-used beyond `max_sessions` and
+    after `ttl_seconds` without a turn. Once a session's window exceeds
+    `token_budget`, its oldest turns are folded into the summary in the
+    background (`summarize` is injectable); until that finishes, or if it fails,
+    the trimmed turns are sent as a clipped excerpt after the summary.
+
+    Sessions live in this process only. With more than one uvicorn worker a
+    follow-up request would usually land on a worker that doesn't know the
+    session, so the store is created with `enabled=False` then and the session
+    routes refuse to run.
+    """
+    def __init__(self, max_sessions=1000, ttl_seconds=1800, token_budget=2000,
+                 summary_tokens=300, summarize=summarize_with_gemini, enabled=True):
+        self.enabled = enabled
+        self.max_sessions = max_sessions
+        self.ttl_seconds = ttl_seconds
+        self.token_budget = token_budget
+        self.summary_tokens = summary_tokens
+        self._summarize = summarize
+        self._sessions = OrderedDict()
+        self.counters = {"created": 0, "expired": 0, "evicted": 0, "summaries": 0, "summary_failures": 0}
+
+    def create(self):
+        self._sweep()
+        session = ChatSession(uuid.uuid4().hex)
+        self._sessions[session.id] = session
+        self.counters["created"] += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.counters["evicted"] += 1
+        return session
+
+    def get(self, session_id):
+        self._sweep()
+        session = self._sessions.get(session_id)
+        if session is not None:
+            session.touched_at = time.monotonic()
+            self._sessions.move_to_end(session_id)
+        return session
+
+    def delete(self, session_id):
+        return self._sessions.pop(session_id, None) is not None
+
+    def _sweep(self):
+        # LRU order is also last-use order, so expired sessions sit at the front
+        deadline = time.monotonic() - self.ttl_seconds
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if session.touched_at > deadline:
+                break
+            self._sessions.popitem(last=False)
+            self.counters["expired"] += 1
+
+    def record(self, session, user_text, model_text):
+        """Appends a finished turn and trims the window back under the token budget."""
+        tokens = estimate_text_tokens(user_text) + estimate_text_tokens(model_text)
+        session.turns.append((user_text, model_text, tokens))
+        session.window_tokens += tokens
+        session.turn_count += 1
+
+        # Always keep the newest turn, even if it alone is over budget
+        while session.window_tokens > self.token_budget and len(session.turns) > 1:
+            turn = session.turns.popleft()
+            session.window_tokens -= turn[2]
+            session.unsummarized.append(turn)
+        if session.unsummarized and session.summarizing is None:
+            session.summarizing = asyncio.create_task(self._fold(session))
+
+    def contents(self, session, query):
+        return session.contents(query, self.summary_tokens * 4)
+
+    async def _fold(self, session):
+        """Folds trimmed turns into the summary, one batch at a time."""
+        try:
+            while session.unsummarized:
+                batch = list(session.unsummarized)
+                try:
+                    summary = await self._summarize(session.summary, batch, self.summary_tokens)
+                except Exception as e:
+                    self.counters["summary_failures"] += 1
+                    print(f"⚠ Failed to summarize chat session {session.id}: {e}")
+                    # Keep only what the excerpt can still show; retry with the next trim
+                    while sum(turn[2] for turn in session.unsummarized) > self.summary_tokens:
+                        session.unsummarized.pop(0)
+                    return
+                if summary:
+                    session.summary = summary
+                    self.counters["summaries"] += 1
+                del session.unsummarized[:len(batch)]
+        finally:
+            session.summarizing = None
+
+    def stats(self):
+        return {**self.counters, "sessions": len(self._sessions)}
+
+
+chat_sessions = ChatSessionStore(
+    max_sessions=settings.CHAT_SESSION_MAX,
+    ttl_seconds=settings.CHAT_SESSION_TTL_SECONDS,
+    token_budget=settings.CHAT_SESSION_TOKEN_BUDGET,
+    summary_tokens=settings.CHAT_SESSION_SUMMARY_TOKENS,
+    enabled=broker_worker_count() == 1,
+)
+if not chat_sessions.enabled:
+    print("⚠ Chat sessions are disabled: they are kept per process and this deployment runs several workers")
@@ -0,0 +1,196 @@
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+
+from fastapi import WebSocketDisconnect
+
+from app.core.config import settings
+from app.utils.json_codec import dumps, loads
+
+_PING_FRAME_PREFIX = '{"type":"ping","ts":'
+
+
+class SupervisedConnection:
+    """
+    One accepted WebSocket plus its liveness and traffic counters.
+
+    Handlers receive and send through it so inbound activity and bytes are
+    accounted for, and run watch() next to their own loops: it returns (closing
+    the socket) once the connection is idle for too long, outlives its maximum
+    duration, or stops answering pings after having answered one before.
+    Application-level {"type": "ping"} frames are only sent when
+    `heartbeat_seconds` is set, i.e. to clients that opted in with ?heartbeat=1;
+    everyone else relies on the server's protocol-level pings. A `paused`
+    connection is not closed as idle.
+    """
+    def __init__(self, conn_id, websocket, kind, meeting_id=None,
+                 idle_seconds=0, max_seconds=0, heartbeat_seconds=20, pong_timeout=20):
+        self.id = conn_id
+        self.websocket = websocket
+        self.kind = kind
+        self.meeting_id = meeting_id
+        self.idle_seconds = idle_seconds
+        self.max_seconds = max_seconds
+        self.heartbeat_seconds = heartbeat_seconds
+        self.pong_timeout = pong_timeout
+        self.opened_at = time.monotonic()
+        self.last_received = self.opened_at
+        self.last_pong = None
+        self._unanswered_since = None   # when the oldest ping still waiting for a pong went out
+        self.pubsub = None         # set by handlers that read from the broker
+        self.paused = False        # set while an audio client has paused streaming
+        self.close_reason = None
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.messages_in = 0
+        self.messages_out = 0
+
+    async def receive(self):
+        """websocket.receive() that records activity and consumes pong replies."""
+        while True:
+            message = await self.websocket.receive()
+            if message["type"] == "websocket.disconnect":
+                raise WebSocketDisconnect(message.get("code", 1000))
+            self.last_received = time.monotonic()
+            self.messages_in += 1
+            data = message.get("bytes")
+            if data is not None:
+                self.bytes_in += len(data)
+                return message
+            text = message.get("text") or ""
+            self.bytes_in += len(text)
+            if '"pong"' in text and self._is_pong(text):
+                self.last_pong = self.last_received
+                self._unanswered_since = None
+                continue
+            return message
+
+    async def receive_text(self):
+        while True:
+            message = await self.receive()
+            if message.get("text") is not None:
+                return message["text"]
+
+    async def send_text(self, frame):
+        await self.websocket.send_text(frame)
+        self.bytes_out += len(frame)
+        self.messages_out += 1
+
+    async def send_json(self, data):
+        await self.send_text(dumps(data))
+
+    async def drain(self):
+        """Reads (and ignores) client messages until it disconnects; for send-only sockets."""
+        try:
+            while True:
+                await self.receive()
+        except WebSocketDisconnect:
+            pass
+
+    async def watch(self):
+        """Sends heartbeats and returns once the connection should be closed."""
+        ping_sent = None
+        while True:
+            await asyncio.sleep(self._next_check())
+            now = time.monotonic()
+            reason = self._expired(now)
+            if reason:
+                self.close_reason = reason
+                print(f"⏱ Closing {self.kind} WebSocket {self.id} ({reason})")
+                try:
+                    await self.websocket.close(code=1001, reason=reason)
+                except Exception:
+                    pass
+                return
+            if self.heartbeat_seconds and (ping_sent is None or now - ping_sent >= self.heartbeat_seconds):
+                try:
+                    await self.send_text(f"{_PING_FRAME_PREFIX}{time.time():.3f}}}")
+                except Exception as e:
+                    self.close_reason = f"ping failed: {e}"
+                    return
+                ping_sent = now
+                if self._unanswered_since is None:
+                    self._unanswered_since = now
+
+    def _next_check(self):
+        limits = [limit for limit in (self.heartbeat_seconds, self.idle_seconds, self.max_seconds) if limit]
+        return min(min(limits, default=30) / 2, 5)
+
+    def _expired(self, now):
+        if self.max_seconds and now - self.opened_at > self.max_seconds:
+            return "max duration reached"
+        if self.idle_seconds and not self.paused and now - self.last_received > self.idle_seconds:
+            return "idle"
+        # Only clients that have answered a ping before are held to answering them
+        if (self.pong_timeout and self.last_pong is not None and self._unanswered_since is not None
+                and now - self._unanswered_since > self.pong_timeout):
+            return "pong timeout"
+        return None
+
+    @staticmethod
+    def _is_pong(text):
+        try:
+            data = loads(text)
+        except ValueError:
+            return False
+        return isinstance(data, dict) and data.get("type") == "pong"
+
+    def snapshot(self):
+        now = time.monotonic()
+        info = {
+            "id": self.id,
+            "kind": self.kind,
+            "meeting_id": self.meeting_id,
+            "age_seconds": round(now - self.opened_at, 1),
+            "idle_seconds": round(now - self.last_received, 1),
+            "bytes_in": self.bytes_in,
+            "bytes_out": self.bytes_out,
+            "messages_in": self.messages_in,
+            "messages_out": self.messages_out,
+        }
+        if self.pubsub is not None:
+            info["queue_depth"] = self.pubsub.local_queue.qsize()
+            info["queue_stats"] = dict(self.pubsub.stats)
+        return info
+
+
+class ConnectionSupervisor:
+    """Registry of the WebSocket connections this worker is serving."""
+    LIMITS = {
+        "audio": ("WS_AUDIO_IDLE_SECONDS", "WS_MAX_CONNECTION_SECONDS"),
+        "chat": ("WS_VIEWER_IDLE_SECONDS", "WS_MAX_CONNECTION_SECONDS"),
+        "monitor": ("WS_VIEWER_IDLE_SECONDS", "WS_MAX_CONNECTION_SECONDS"),
+    }
+
+    def __init__(self):
+        self.connections = {}
+        self._ids = itertools.count(1)
+
+    @asynccontextmanager
+    async def supervise(self, websocket, kind, meeting_id=None):
+        """Registers an accepted WebSocket for the duration of the block."""
+        idle_setting, max_setting = self.LIMITS[kind]
+        # Only clients that say they answer app-level pings get them
+        heartbeat = websocket.query_params.get("heartbeat", "0").lower() in ("1", "true", "yes", "on")
+        conn = SupervisedConnection(
+            next(self._ids), websocket, kind, meeting_id,
+            idle_seconds=getattr(settings, idle_setting),
+            max_seconds=getattr(settings, max_setting),
+            heartbeat_seconds=settings.WS_HEARTBEAT_SECONDS if heartbeat else 0,
+            pong_timeout=settings.WS_PONG_TIMEOUT_SECONDS,
+        )
+        self.connections[conn.id] = conn
+        try:
+            yield conn
+        finally:
+            del self.connections[conn.id]
+
+    def for_meeting(self, meeting_id):
+        return [conn for conn in self.connections.values() if conn.meeting_id == meeting_id]
+
+    def snapshot(self):
+        return [conn.snapshot() for conn in self.connections.values()]
+
+
+connections = ConnectionSupervisor()
@@ -0,0 +1,169 @@
+import asyncio
+import itertools
+import time
+from collections import OrderedDict
+
+from google.genai.types import CachedContent, CreateCachedContentConfig, UpdateCachedContentConfig
+
+from app.core.config import settings
+from app.services.gemini_client import google_client
+
+
+class LocalCachedContents:
+    """
+    In-memory stand-in for google_client.aio.caches (create/update/delete), for
+    exercising ContextCacheManager without Gemini. It records the calls it gets.
+    """
+    def __init__(self):
+        self.contents = {}
+        self.calls = []
+        self._ids = itertools.count(1)
+
+    async def create(self, *, model, config=None):
+        name = f"cachedContents/local-{next(self._ids)}"
+        self.calls.append(("create", name))
+        self.contents[name] = CachedContent(name=name, model=model, display_name=config.display_name)
+        return self.contents[name]
+
+    async def update(self, *, name, config=None):
+        self.calls.append(("update", name))
+        if name not in self.contents:
+            raise KeyError(name)
+        return self.contents[name]
+
+    async def delete(self, *, name, config=None):
+        self.calls.append(("delete", name))
+        self.contents.pop(name, None)
+
+
+class ContextCacheManager:
+    """
+    Gemini cached contents for large, stable request prefixes (documents and
+    their system instruction), so follow-up requests send only the new input.
+
+    Entries are looked up by `key` and tagged with a `fingerprint` of what the
+    prefix was built from; a different fingerprint for the same key means the
+    source changed, so the old cached content is deleted and a new one created.
+    Hits within `refresh_seconds` of expiry extend the TTL upstream. Beyond
+    `max_entries` the least recently used entry is deleted. A prefix Gemini
+    refuses to cache (e.g. below the model's minimum size) is remembered for one
+    TTL so we don't retry it on every request.
+
+    `caches` defaults to google_client.aio.caches and can be swapped for
+    LocalCachedContents.
+    """
+    def __init__(self, caches=None, ttl_seconds=3600, refresh_seconds=600, max_entries=128):
+        self.caches = caches or google_client.aio.caches
+        self.ttl_seconds = ttl_seconds
+        self.refresh_seconds = refresh_seconds
+        self.max_entries = max_entries
+        self._entries = OrderedDict()   # key -> entry dict
+        self._inflight = {}
+        self.counters = {"hits": 0, "created": 0, "refreshed": 0, "stale": 0, "evicted": 0, "failed": 0}
+
+    async def get(self, key, fingerprint, model, contents=None, system_instruction=None):
+        """Name of the cached content for `key`, creating it if needed; None if it can't be cached."""
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry is not None:
+            if entry["fingerprint"] != fingerprint:
+                self.counters["stale"] += 1
+                self._drop(key)
+            elif entry["expires_at"] <= now:
+                self._entries.pop(key)
+            else:
+                self._entries.move_to_end(key)
+                if entry["name"] is None:
+                    return None
+                entry["hits"] += 1
+                self.counters["hits"] += 1
+                if entry["expires_at"] - now < self.refresh_seconds:
+                    await self._refresh(entry)
+                return entry["name"]
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.ensure_future(
+                self._create(key, fingerprint, model, contents, system_instruction)
+            )
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        entry = await asyncio.shield(task)
+        return entry["name"]
+
+    async def _create(self, key, fingerprint, model, contents, system_instruction):
+        try:
+            cached = await self.caches.create(
+                model=model,
+                config=CreateCachedContentConfig(
+                    contents=contents,
+                    system_instruction=system_instruction,
+                    ttl=f"{int(self.ttl_seconds)}s",
+                    display_name=key[:128],
+                ),
+            )
+            name = cached.name
+            self.counters["created"] += 1
+            print(f"🗄 Created Gemini context cache {name} for {key}")
+        except Exception as e:
+            name = None
+            self.counters["failed"] += 1
+            print(f"⚠ Gemini context cache not created for {key}: {e}")
+        entry = {
+            "name": name,
+            "fingerprint": fingerprint,
+            "expires_at": time.monotonic() + self.ttl_seconds,
+            "hits": 0,
+            "refreshes": 0,
+        }
+        self._entries[key] = entry
+        while len(self._entries) > self.max_entries:
+            oldest = next(iter(self._entries))
+            self.counters["evicted"] += 1
+            self._drop(oldest)
+        return entry
+
+    async def _refresh(self, entry):
+        try:
+            await self.caches.update(
+                name=entry["name"],
+                config=UpdateCachedContentConfig(ttl=f"{int(self.ttl_seconds)}s"),
+            )
+            entry["expires_at"] = time.monotonic() + self.ttl_seconds
+            entry["refreshes"] += 1
+            self.counters["refreshed"] += 1
+        except Exception as e:
+            # It expires on its own; the next request after that creates a new one
+            print(f"⚠ Failed to refresh Gemini context cache {entry['name']}: {e}")
+
+    def _drop(self, key):
+        entry = self._entries.pop(key)
+        if entry["name"] is not None:
+            asyncio.ensure_future(self._delete(entry["name"]))
+
+    async def _delete(self, name):
+        try:
+            await self.caches.delete(name=name)
+        except Exception as e:
+            print(f"⚠ Failed to delete Gemini context cache {name}: {e}")
+
+    def stats(self):
+        now = time.monotonic()
+        return {
+            **self.counters,
+            "entries": {
+                key: {
+                    "name": entry["name"],
+                    "hits": entry["hits"],
+                    "refreshes": entry["refreshes"],
+                    "expires_in": round(entry["expires_at"] - now),
+                }
+                for key, entry in self._entries.items()
+            },
+        }
+
+
+context_caches = ContextCacheManager(
+    ttl_seconds=settings.CONTEXT_CACHE_TTL_SECONDS,
+    refresh_seconds=settings.CONTEXT_CACHE_REFRESH_SECONDS,
+    max_entries=settings.CONTEXT_CACHE_MAX_ENTRIES,
+)
@@ -1,4 +1,6 @@
 from app.core.config import settings
+from app.utils.limiter import ConcurrencyLimiter
+from app.utils.cache import ResponseCache
 from google.genai import Client
 
 from pydantic import BaseModel
@@ -11,4 +13,17 @@ class GeminiResponse(BaseModel):
 
 google_client= Client(
     api_key=settings.GEMINI_API_KEY
-)
\ No newline at end of file
+)
+
+# Shared by the REST chat routes so a burst of slow Gemini calls is bounded
+chat_limiter = ConcurrencyLimiter(
+    settings.GEMINI_MAX_CONCURRENCY,
+    settings.GEMINI_QUEUE_TIMEOUT,
+)
+
+# Opt-in (?cache=true) cache of chat answers; answers are sampled at temperature 1.0,
+# so callers choose whether a recent answer to the same question is good enough
+chat_cache = ResponseCache(
+    max_entries=settings.CHAT_CACHE_MAX_ENTRIES,
+    ttl_seconds=settings.CHAT_CACHE_TTL_SECONDS,
+)
@@ -1,11 +1,198 @@
 import smtplib
 import os
+import hashlib
+import hmac
+import secrets
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from email.mime.application import MIMEApplication
 from app.core.config import settings
 
 
+class SmtpConnectionPool:
+    """
+    Authenticated SMTP connections for one account, kept open across sends so
+    each mail skips the TCP connect, STARTTLS handshake and login.
+
+    Idle connections are reused newest first. One idle for more than
+    `idle_seconds` is closed instead; one idle for more than `check_after`
+    seconds is probed with NOOP first. A connection is retired after
+    `max_messages` mails, and a send that finds the server gone
+    (SMTPServerDisconnected) is retried once on a fresh connection.
+    reap() closes connections past `idle_seconds` without waiting for a send.
+    """
+    def __init__(self, host, port, user, password, max_idle=2, idle_seconds=60,
+                 check_after=5, max_messages=50, timeout=30):
+        self.host = host
+        self.port = port
+        self.user = user
+        self.password = password
+        self.max_idle = max_idle
+        self.idle_seconds = idle_seconds
+        self.check_after = check_after
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self._idle = []               # [(server, last used, messages sent)]
+        self._lock = threading.Lock()
+        self.stats = {"opened": 0, "reused": 0, "closed": 0, "reconnects": 0}
+
+    def _open(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        try:
+            server.starttls()  # Secure connection
+            server.login(self.user, self.password)
+        except Exception:
+            self._close(server)
+            raise
+        self.stats["opened"] += 1
+        return server, 0
+
+    def _close(self, server):
+        try:
+            server.quit()
+        except Exception:
+            server.close()
+        self.stats["closed"] += 1
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    break
+                server, last_used, sent = self._idle.pop()
+            idle_for = time.monotonic() - last_used
+            if idle_for > self.idle_seconds:
+                self._close(server)
+                continue
+            if idle_for > self.check_after:
+                try:
+                    healthy = server.noop()[0] == 250
+                except smtplib.SMTPException:
+                    healthy = False
+                if not healthy:
+                    self._close(server)
+                    continue
+            self.stats["reused"] += 1
+            return server, sent
+        return self._open()
+
+    def _checkin(self, server, sent):
+        if sent < self.max_messages:
+            with self._lock:
+                if len(self._idle) < self.max_idle:
+                    self._idle.append((server, time.monotonic(), sent))
+                    return
+        self._close(server)
+
+    def sendmail(self, from_addr, to_addrs, message):
+        server, sent = self._checkout()
+        try:
+            server.sendmail(from_addr, to_addrs, message)
+        except smtplib.SMTPServerDisconnected:
+            # The server dropped a pooled connection; retry once on a new one
+            self.stats["reconnects"] += 1
+            self.stats["closed"] += 1
+            server.close()
+            server, sent = self._open()
+            try:
+                server.sendmail(from_addr, to_addrs, message)
+            except Exception:
+                self._close(server)
+                raise
+        except smtplib.SMTPRecipientsRefused:
+            # The session itself is still fine
+            self._checkin(server, sent + 1)
+            raise
+        except Exception:
+            self._close(server)
+            raise
+        self._checkin(server, sent + 1)
+
+    def reap(self):
+        """Closes idle connections past `idle_seconds`."""
+        deadline = time.monotonic() - self.idle_seconds
+        with self._lock:
+            expired = [entry for entry in self._idle if entry[1] <= deadline]
+            self._idle = [entry for entry in self._idle if entry[1] > deadline]
+        for server, _, _ in expired:
+            # Gmail has usually dropped these already, so don't wait on a QUIT
+            server.close()
+            self.stats["closed"] += 1
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for server, _, _ in idle:
+            self._close(server)
+
+
+# Pools by account. Keys carry an HMAC of the password (salted per process)
+# rather than the password itself. A pool is dropped once no send is using it
+# and it has no idle connections left.
+_pools = {}                   # key -> [pool, sends in progress]
+_pools_lock = threading.Lock()
+_key_salt = secrets.token_bytes(16)
+_reaper = None
+
+
+def _pool_key(host, port, user, password):
+    digest = hmac.new(_key_salt, password.encode("utf-8"), hashlib.sha256).hexdigest()
+    return host, port, user, digest
+
+
+def _release_pool(key, slot):
+    # Called with _pools_lock held; no send is checking connections in or out then
+    if slot[1] == 0 and not slot[0]._idle and _pools.get(key) is slot:
+        del _pools[key]
+
+
+def _reap_pools():
+    """Background thread closing idle connections for every account until no pools are left."""
+    global _reaper
+    while True:
+        time.sleep(max(1.0, settings.SMTP_IDLE_SECONDS / 2))
+        with _pools_lock:
+            slots = list(_pools.items())
+        for key, slot in slots:
+            slot[0].reap()
+            with _pools_lock:
+                _release_pool(key, slot)
+        with _pools_lock:
+            if not _pools:
+                _reaper = None
+                return
+
+
+def send_pooled(host, port, user, password, from_addr, to_addrs, message):
+    """Sends one message over the account's connection pool."""
+    global _reaper
+    key = _pool_key(host, port, user, password)
+    with _pools_lock:
+        slot = _pools.get(key)
+        if slot is None:
+            slot = _pools[key] = [SmtpConnectionPool(
+                host, port, user, password,
+                max_idle=settings.SMTP_POOL_SIZE,
+                idle_seconds=settings.SMTP_IDLE_SECONDS,
+                check_after=settings.SMTP_HEALTHCHECK_AFTER_SECONDS,
+                max_messages=settings.SMTP_MAX_MESSAGES_PER_CONNECTION,
+                timeout=settings.SMTP_TIMEOUT_SECONDS,
+            ), 0]
+        slot[1] += 1
+        if _reaper is None:
+            _reaper = threading.Thread(target=_reap_pools, name="smtp-pool-reaper", daemon=True)
+            _reaper.start()
+    pool = slot[0]
+    try:
+        pool.sendmail(from_addr, to_addrs, message)
+    finally:
+        with _pools_lock:
+            slot[1] -= 1
+            # A login that failed leaves nothing idle, so its pool goes right away
+            _release_pool(key, slot)
+
 
 class GmailSender:
     def __init__(self, user_id: str, app_password: str):
@@ -45,12 +232,12 @@ class GmailSender:
                         )
                         message.attach(file_attachment)
 
-        # Connect and send
-        with smtplib.SMTP(self.smtp_server, self.smtp_port) as server:
-            server.starttls()  # Secure connection
-            server.login(self.user_id, self.app_password)
-            server.sendmail(self.user_id, to_email, message.as_string())
-            print("✅ Email sent successfully!")
+        # Send over a pooled, already authenticated connection
+        send_pooled(
+            self.smtp_server, self.smtp_port, self.user_id, self.app_password,
+            self.user_id, to_email, message.as_string(),
+        )
+        print("✅ Email sent successfully!")
 
 
 gmail_sender = GmailSender(settings.GMAIL_USER, settings.GMAIL_APP_PASSWORD)
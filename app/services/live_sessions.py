@@ -0,0 +1,286 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+
+from google.genai import types
+
+from app.core.config import settings
+from app.services.gemini_client import google_client
+from app.services.redis_client import redis_client
+from app.services.transcripts import TranscriptAssembler, transcripts
+from app.services.scheduler import Priority, estimate_tokens, gemini_scheduler
+from app.utils.answer_stream import MarkerSplitter
+from app.utils.json_codec import dumps, loads
+from app.utils.tasks import run_until_first_done
+
+GO_AWAY = "go_away"   # what _receive returns when the server asks us to reconnect
+
+
+class MeetingSession:
+    """
+    The Gemini Live session of one meeting, shared by all of its audio connections.
+
+    Connections write PCM into the shared jitter buffer and send text through
+    send_text(); the session streams the audio upstream, relays answers to the
+    meeting channel and answers `query` messages published on it. Input audio
+    transcription is assembled into segments that are published as `transcript`
+    messages and stored for search. If the live
+    connection drops, or the server announces a GoAway, it reconnects with the
+    latest session resumption handle so the model keeps the meeting's context.
+    """
+    def __init__(self, meeting_id, config, connect, buffer, vad=None, stream_answers=True):
+        self.meeting_id = meeting_id
+        self.channel_id = f"channel:meeting:{meeting_id}"
+        self.config = config
+        self.buffer = buffer
+        self.vad = vad
+        self.stream_answers = stream_answers
+        self.refs = 0
+        self.session = None
+        self.resumption_handle = None
+        self.started_at = time.monotonic()
+        self.reconnects = 0
+        self.closed = asyncio.Event()
+        self._connect = connect
+        self._connected = asyncio.Event()
+        self._task = None
+        self._teardown = None
+        self._splitter = MarkerSplitter("|end|")
+        self._parts = []
+        self._turn = 0
+        self._transcript = TranscriptAssembler() if settings.TRANSCRIPT_ENABLED else None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+    async def send_text(self, prompt, end_of_turn=True):
+        """Sends text to the model, waiting briefly if the session is (re)connecting."""
+        # Questions asked in a meeting go ahead of every other queued Gemini call
+        await gemini_scheduler.admit(Priority.LIVE, estimate_tokens([prompt]))
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + settings.LIVE_CONNECT_TIMEOUT
+        while True:
+            await asyncio.wait_for(self._connected.wait(), max(0, deadline - loop.time()))
+            # The session may have dropped again before we got to run; wait for the next one
+            session = self.session
+            if session is not None:
+                break
+        await session.send(input=prompt, end_of_turn=end_of_turn)
+
+    def snapshot(self):
+        info = {
+            "meeting_id": self.meeting_id,
+            "connections": self.refs,
+            "age_seconds": round(time.monotonic() - self.started_at, 1),
+            "connected": self._connected.is_set(),
+            "resumable": self.resumption_handle is not None,
+            "reconnects": self.reconnects,
+            "audio": self.buffer.metrics(),
+        }
+        if self.vad is not None:
+            info["vad"] = dict(self.vad.stats)
+        return info
+
+    def publish(self, payload, record=True):
+        redis_client.publish(self.channel_id, dumps(payload), record)
+
+    async def _run(self):
+        try:
+            if self._transcript is not None:
+                try:
+                    # Resumed meetings keep numbering (and searching) their earlier segments
+                    await transcripts.start(self.meeting_id)
+                except Exception as e:
+                    print(f"⚠ Failed to load transcript for meeting {self.meeting_id}: {e}")
+            await run_until_first_done(self._stay_connected(), self._listen_for_queries())
+        except Exception as e:
+            print(f"⚠ Gemini session for meeting {self.meeting_id} stopped: {e}")
+        finally:
+            if self._transcript is not None:
+                self._record_transcript(self._transcript.flush())
+            self.closed.set()
+            self.publish({"type": "close", "message": "Manager has closed the connection."})
+
+    async def _stay_connected(self):
+        failures = 0
+        while True:
+            config = {**self.config, "session_resumption": types.SessionResumptionConfig(handle=self.resumption_handle)}
+            connected_at = time.monotonic()
+            try:
+                async with self._connect(model=settings.GEMINI_LIVE_MODEL, config=config) as session:
+                    state = "resumed" if self.resumption_handle else "started"
+                    print(f"🎤 Gemini session {state} for meeting: {self.meeting_id}")
+                    self.session = session
+                    self._connected.set()
+                    outcome = await run_until_first_done(self._send_audio(session), self._receive(session))
+                    if outcome != GO_AWAY:
+                        raise ConnectionError("live session ended without a GoAway")
+                # The server asked us to move (GoAway); reconnect straight away
+                failures = 0
+            except Exception as e:
+                print(f"⚠ Gemini session error for meeting {self.meeting_id}: {e}")
+                # A connection that stayed up for a while is not part of a failure streak
+                failures = 1 if time.monotonic() - connected_at > 60 else failures + 1
+            finally:
+                self.session = None
+                self._connected.clear()
+
+            if failures > settings.LIVE_MAX_RECONNECTS:
+                print(f"❌ Giving up on Gemini session for meeting {self.meeting_id}")
+                return
+            if failures:
+                await asyncio.sleep(min(0.5 * 2 ** (failures - 1), 10))
+            self.reconnects += 1
+
+    async def _send_audio(self, session):
+        """Streams jitter-buffer frames upstream, minus silence when VAD is on."""
+        while True:
+            frame = await self.buffer.next_frame()
+            frames = [frame] if self.vad is None else self.vad.process(frame)
+            for chunk in frames:
+                await session.send_realtime_input(
+                    audio=types.Blob(data=chunk, mime_type="audio/pcm;rate=16000")
+                )
+
+    async def _receive(self, session):
+        """Relays model text and transcripts and tracks resumption handles; returns GO_AWAY when the server sends one."""
+        while True:
+            async for response in session.receive():
+                update = response.session_resumption_update
+                if update and update.resumable and update.new_handle:
+                    self.resumption_handle = update.new_handle
+                if response.go_away is not None:
+                    print(f"🔁 Gemini GoAway for meeting {self.meeting_id}, reconnecting")
+                    return GO_AWAY
+                content = response.server_content
+                if self._transcript is not None and content and content.input_transcription:
+                    transcription = content.input_transcription
+                    self._record_transcript(
+                        self._transcript.feed(transcription.text, bool(transcription.finished))
+                    )
+                if response.text:
+                    self._relay_text(response.text)
+
+    def _record_transcript(self, segment):
+        if not segment:
+            return
+        seq = transcripts.record(self.meeting_id, segment)
+        self.publish({"type": "transcript", "index": seq, "text": segment})
+
+    def _relay_text(self, chunk):
+        """
+        Publishes text as `answer_delta` messages while it arrives and the full
+        text as an `answer` message once the |end| marker closes the turn.
+        """
+        for text, turn_complete in self._splitter.feed(chunk):
+            if text:
+                self._parts.append(text)
+                if self.stream_answers:
+                    # Deltas stay out of the replay buffer; late joiners get the final answer
+                    self.publish({
+                        "type": "answer_delta",
+                        "turn": self._turn,
+                        "index": len(self._parts) - 1,
+                        "text": text,
+                    }, record=False)
+            if turn_complete:
+                final_text = "".join(self._parts).strip()
+                self.publish({"type": "answer", "turn": self._turn, "text": final_text})
+                print(f"📤 Published answer to Redis: {final_text[:50]}...")
+                self._parts = []  # Reset for the next message
+                self._turn += 1
+
+    async def _listen_for_queries(self):
+        """Forwards `query` messages published on the meeting channel to the model."""
+        pubsub = redis_client.pubsub()
+        pubsub.subscribe(self.channel_id)
+        try:
+            async for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                try:
+                    # Cheap check first: most traffic here is answers and transcripts
+                    raw = message["data"]
+                    if (b'"query"' if isinstance(raw, bytes) else '"query"') not in raw:
+                        continue
+                    data = loads(raw)
+                    if data.get("type") == "query" and data.get("text"):
+                        print(f"📥 Received query from Redis: {data}")
+                        await self.send_text(data["text"], end_of_turn=True)
+                except Exception as e:
+                    print(f"⚠ Redis message error: {e}")
+        finally:
+            pubsub.close()
+
+
+class LiveSessionRegistry:
+    """
+    Owns one MeetingSession per meeting id.
+    Sessions are reference counted by the connections using them; when the last
+    one leaves, the session lingers for `grace_seconds` so a reconnecting client
+    picks the same live session back up instead of paying setup again.
+    `connect` defaults to google_client.aio.live.connect and can be swapped for
+    a local stand-in.
+    """
+    def __init__(self, connect=None, grace_seconds=None):
+        self._connect = connect or google_client.aio.live.connect
+        self.grace_seconds = settings.LIVE_SESSION_GRACE_SECONDS if grace_seconds is None else grace_seconds
+        self.sessions = {}
+        self._closing = set()         # teardown tasks, kept referenced until they finish
+
+    @asynccontextmanager
+    async def attach(self, meeting_id, config, buffer_factory, vad=None, stream_answers=True):
+        """
+        Yields the meeting's session, starting it if needed. The first connection's
+        config, buffer and VAD settings apply for the lifetime of the session.
+        """
+        meeting = self.sessions.get(meeting_id)
+        if meeting is None or meeting.closed.is_set():
+            meeting = MeetingSession(
+                meeting_id, config, self._connect, buffer_factory(),
+                vad=vad, stream_answers=stream_answers,
+            )
+            self.sessions[meeting_id] = meeting
+            meeting.start()
+        if meeting._teardown is not None:
+            meeting._teardown.cancel()
+            meeting._teardown = None
+        meeting.refs += 1
+        try:
+            yield meeting
+        finally:
+            self._release(meeting)
+
+    def _release(self, meeting):
+        meeting.refs -= 1
+        if meeting.refs > 0:
+            return
+        loop = asyncio.get_running_loop()
+        meeting._teardown = loop.call_later(self.grace_seconds, self._start_close, meeting)
+
+    def _start_close(self, meeting):
+        task = asyncio.get_running_loop().create_task(self._close(meeting))
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    async def _close(self, meeting):
+        if meeting.refs > 0:
+            return
+        if self.sessions.get(meeting.meeting_id) is meeting:
+            del self.sessions[meeting.meeting_id]
+        await meeting.close()
+        await transcripts.flush()
+        if meeting.meeting_id not in self.sessions:
+            transcripts.finish(meeting.meeting_id)
+        print(f"🧹 Closed Gemini session for meeting: {meeting.meeting_id}")
+        print(f"📊 Audio buffer for meeting {meeting.meeting_id}: {meeting.buffer.metrics()}")
+        if meeting.vad is not None:
+            print(f"📊 VAD for meeting {meeting.meeting_id}: {meeting.vad.stats}")
+
+
+live_sessions = LiveSessionRegistry()
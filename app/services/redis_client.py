@@ -8,123 +8,641 @@
 #         port=settings.REDIS_PORT
 #         )
 
-import multiprocessing
-import queue
+import asyncio
+import fnmatch
+import heapq
+import os
+import re
+import sys
+import time
 import uuid
+from collections import OrderedDict, deque
+from enum import Enum
+from app.core.config import settings
+from app.utils.json_codec import with_field
 
 
-# --- Start of user's multiprocessing-safe FakeRedis classes ---
+class OverflowPolicy(str, Enum):
+    """What a publish does when a subscriber's queue is full."""
+    DROP_OLDEST = "drop_oldest"   # discard the oldest queued message to make room
+    DROP_NEWEST = "drop_newest"   # discard the message being published
+    BLOCK = "block"               # wait up to the channel timeout for room, then drop
+    DISCONNECT = "disconnect"     # cut the slow subscriber off
+
+
+_GLOB_CHARS = re.compile(r"[*?\[\\]")
+
+
+def _literal_prefix(pattern):
+    """The part of a glob pattern before its first wildcard, used to index patterns."""
+    match = _GLOB_CHARS.search(pattern)
+    return pattern[:match.start()] if match else pattern
+
+
+_LIST_BASE = sys.getsizeof([])
+
+
+def _item_sizeof(item):
+    """Footprint of one list item: the object plus its slot in the list."""
+    return sys.getsizeof(item) + 8
+
+
+def _sizeof(key, value):
+    """Rough memory footprint of one key, used for the REDIS_MAXMEMORY budget."""
+    if isinstance(value, list):
+        return sys.getsizeof(key) + _LIST_BASE + sum(_item_sizeof(item) for item in value)
+    return sys.getsizeof(key) + sys.getsizeof(value)
+
+
+def _inclusive_slice(items, start, end):
+    """Redis-style LRANGE slice where `end` is inclusive and -1 means the last item."""
+    return items[start:None if end == -1 else end + 1]
+
+
+def _running_loop():
+    """Returns the event loop running in this thread, or None."""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+# --- Start of in-process asyncio FakeRedis classes ---
 class FakePubSub:
     """
-    A multiprocessing-safe PubSub client.
-    Each instance has its own unique ID and a local queue for messages.
+    An asyncio-native PubSub client.
+    Each instance owns a bounded asyncio.Queue that the broker delivers into
+    directly, so readers can await messages instead of polling a proxied queue.
+    When the queue is full the channel's OverflowPolicy decides what happens.
+    Under BLOCK, up to BLOCK_OVERFLOW messages wait in order behind the queue,
+    each for at most the channel timeout; anything beyond that is dropped.
     """
-    def __init__(self, store):
+    BLOCK_OVERFLOW = 16
+
+    def __init__(self, store, capacity=None):
         self.store = store
         self.subscriptions = set()
+        self.patterns = set()
         self.closed = False
+        self.disconnected = False
         self._unique_id = str(uuid.uuid4())
-        self.local_queue = self.store._manager.Queue()
-
-    def subscribe(self, *channels):
-        """Subscribes this client to one or more channels."""
-        with self.store._lock:
-            for channel in channels:
-                if channel not in self.store._subscribers:
-                    self.store._subscribers[channel] = self.store._manager.list()
-                
-                # Add this client's unique ID to the list of subscribers for the channel
-                self.store._subscribers[channel].append(self._unique_id)
-                self.subscriptions.add(channel)
-
-            # Store the local queue in the shared dictionary, mapped by unique ID
-            self.store._queues[self._unique_id] = self.local_queue
+        self.capacity = capacity or settings.PUBSUB_QUEUE_SIZE
+        self.local_queue = asyncio.Queue(maxsize=self.capacity)
+        self._loop = None
+        self._overflow = deque()      # (message, deadline) waiting for room under BLOCK
+        self._drainer = None
+        # delivered: queued for us, dropped: lost to overflow,
+        # lagging: arrived while our queue was at least half full
+        self.stats = {"delivered": 0, "dropped": 0, "lagging": 0}
+
+    def subscribe(self, *channels, after_seq=None, replay_seconds=None):
+        """
+        Subscribes this client to one or more channels.
+        On replayable channels, `after_seq` first queues the buffered messages newer
+        than that sequence id and `replay_seconds` the ones from that time window.
+        """
+        # Remember which loop owns the queue so off-loop publishers can hand over safely
+        self._loop = self._loop or _running_loop()
+        for channel in channels:
+            self.store._subscribers.setdefault(channel, {})[self._unique_id] = self
+            self.subscriptions.add(channel)
+            if after_seq is not None or replay_seconds is not None:
+                policy, timeout = self.store._policy_for(channel)
+                for message in self.store.replay(channel, after_seq, replay_seconds):
+                    self._enqueue(message, policy, timeout)
 
     def unsubscribe(self, *channels):
-        """Unsubscribes this client from one or more channels."""
-        with self.store._lock:
-            for channel in channels:
-                if channel in self.subscriptions:
-                    if self._unique_id in self.store._subscribers.get(channel, []):
-                        # Remove our unique ID from the list of subscribers
-                        self.store._subscribers[channel].remove(self._unique_id)
-                    self.subscriptions.discard(channel)
-
-    def get_message(self, timeout=0.1):
-        """Polls for messages from the local queue."""
+        """Unsubscribes this client from one or more channels (all if none given)."""
+        for channel in channels or list(self.subscriptions):
+            if channel in self.subscriptions:
+                subscribers = self.store._subscribers.get(channel)
+                if subscribers is not None:
+                    subscribers.pop(self._unique_id, None)
+                    if not subscribers:
+                        self.store._subscribers.pop(channel, None)
+                self.subscriptions.discard(channel)
+
+    def psubscribe(self, *patterns):
+        """Subscribes to every channel matching the given glob patterns, e.g. channel:meeting:*"""
+        self._loop = self._loop or _running_loop()
+        for pattern in patterns:
+            self.store._add_pattern(pattern, self)
+            self.patterns.add(pattern)
+
+    def punsubscribe(self, *patterns):
+        """Drops pattern subscriptions (all if none given)."""
+        for pattern in patterns or list(self.patterns):
+            if pattern in self.patterns:
+                self.store._remove_pattern(pattern, self)
+                self.patterns.discard(pattern)
+
+    async def get_message(self, timeout=0.1):
+        """
+        Waits up to `timeout` seconds for the next message.
+        `timeout=None` waits forever, `timeout=0` only checks what is already queued.
+        """
         if self.closed:
             return None
         try:
-            data = self.local_queue.get(timeout=timeout)
-            # The data put into the queue already has the channel info
-            return data
-        except queue.Empty:
+            if timeout is None:
+                return await self.local_queue.get()
+            if timeout <= 0:
+                return self.local_queue.get_nowait()
+            return await asyncio.wait_for(self.local_queue.get(), timeout)
+        except (asyncio.TimeoutError, asyncio.QueueEmpty):
             return None
-        except Exception as e:
-            print(f"Error getting message from local queue: {e}")
-        return None
+
+    async def listen(self):
+        """
+        Yields messages as they are delivered, without polling, until the client is
+        closed. A disconnect notice is yielded last so the reader can react to it.
+        """
+        while not self.closed:
+            message = await self.local_queue.get()
+            if message is None:
+                break
+            yield message
+            if message["type"] == "disconnect":
+                break
+
+    def _deliver(self, message, policy, timeout):
+        """Puts a message on this client's queue from whichever thread is publishing."""
+        loop = self._loop
+        if loop is None or loop is _running_loop():
+            self._enqueue(message, policy, timeout)
+        else:
+            loop.call_soon_threadsafe(self._enqueue, message, policy, timeout)
+
+    def _enqueue(self, message, policy, timeout):
+        if self.closed or self.disconnected:
+            return
+        queue = self.local_queue
+        if queue.qsize() * 2 >= self.capacity:
+            self._count("lagging")
+        if self._drainer is not None:
+            # Messages already waiting for room go first
+            self._park(message, timeout)
+            return
+        if not queue.full():
+            queue.put_nowait(message)
+            self._count("delivered")
+            return
+
+        if policy == OverflowPolicy.DROP_OLDEST:
+            queue.get_nowait()
+            self._count("dropped")
+            queue.put_nowait(message)
+            self._count("delivered")
+        elif policy == OverflowPolicy.DROP_NEWEST:
+            self._count("dropped")
+        elif policy == OverflowPolicy.BLOCK and self._loop is not None:
+            # Wait for room in the background so the publisher itself never stalls
+            self._park(message, timeout)
+        elif policy == OverflowPolicy.DISCONNECT:
+            self._disconnect(message.get("channel"))
+        else:
+            self._count("dropped")
+
+    def _park(self, message, timeout):
+        if len(self._overflow) >= self.BLOCK_OVERFLOW:
+            self._count("dropped")
+            return
+        self._overflow.append((message, time.monotonic() + timeout))
+        if self._drainer is None:
+            self._drainer = self._loop.create_task(self._drain_overflow())
+
+    async def _drain_overflow(self):
+        """The one task moving parked messages into the queue, oldest first."""
+        try:
+            while self._overflow:
+                message, deadline = self._overflow.popleft()
+                try:
+                    await asyncio.wait_for(self.local_queue.put(message), deadline - time.monotonic())
+                    self._count("delivered")
+                except asyncio.TimeoutError:
+                    self._count("dropped")
+        finally:
+            self._drainer = None
+
+    def _clear_overflow(self):
+        if self._drainer is not None:
+            self._drainer.cancel()
+            self._drainer = None
+        dropped = len(self._overflow)
+        self._overflow.clear()
+        return dropped
+
+    def _disconnect(self, channel):
+        """Drops everything queued and leaves a single disconnect notice for the reader."""
+        dropped = self.local_queue.qsize() + self._clear_overflow() + 1
+        while not self.local_queue.empty():
+            self.local_queue.get_nowait()
+        self.stats["dropped"] += dropped
+        self.store._stats["dropped"] += dropped
+        self.store._stats["disconnected"] += 1
+        self.disconnected = True
+        self.unsubscribe()
+        self.punsubscribe()
+        self.local_queue.put_nowait({"type": "disconnect", "channel": channel, "data": None})
+        print(f"⚠ Disconnected slow subscriber {self._unique_id} on {channel}")
+
+    def _count(self, name):
+        self.stats[name] += 1
+        self.store._stats[name] += 1
 
     def close(self):
         self.closed = True
-        # Clean up subscriptions and shared queue reference
-        with self.store._lock:
-            for channel in list(self.subscriptions):
-                if self._unique_id in self.store._subscribers.get(channel, []):
-                    self.store._subscribers[channel].remove(self._unique_id)
-            self.store._queues.pop(self._unique_id, None)
+        self._clear_overflow()
+        self.unsubscribe()
+        self.punsubscribe()
+        # Wake up anyone blocked in listen()/get_message()
+        if self.local_queue.full():
+            self.local_queue.get_nowait()
+        self.local_queue.put_nowait(None)
 
 
 class FakeRedis:
     """
-    A fake, multiprocessing-safe Redis client using Manager data structures.
-    This version correctly handles multiple subscribers per channel.
+    A fake, in-process Redis client.
+    Pub/Sub is delivered straight into each subscriber's asyncio.Queue, so a
+    publish is a dict lookup plus one put_nowait per subscriber with no IPC,
+    pickling or global lock.
+
+    Keys (strings and lists share one keyspace) can carry a TTL. Expired keys
+    are removed lazily on access and by a periodic sweep; once the store grows
+    past REDIS_MAXMEMORY the least recently used keys are evicted.
     """
-    def __init__(self, manager=None):
-        ctx = multiprocessing.get_context("spawn")
-        self._manager = manager or multiprocessing.Manager()
-        self._data = self._manager.dict()
-        self._lists = self._manager.dict()
-        self._lock = self._manager.Lock()
-        
-        # New structure for Pub/Sub
-        self._subscribers = self._manager.dict() # channel -> list of unique_ids
-        self._queues = self._manager.dict()      # unique_id -> shared_queue
+    def __init__(self):
+        self._data = OrderedDict()  # key -> value, least recently used first
+        self._sizes = {}            # key -> estimated bytes
+        self._used_memory = 0
+        self._maxmemory = settings.REDIS_MAXMEMORY
+        self._expires = {}          # key -> monotonic deadline
+        self._expiry_heap = []      # (deadline, key); stale entries are skipped
+        self._janitor = None
+
+        # Pub/Sub registry
+        self._subscribers = {}  # channel -> {unique_id: FakePubSub}
+        # Pattern index: literal prefix -> {pattern: {unique_id: FakePubSub}}.
+        # A publish only looks at buckets whose prefix is a prefix of the channel.
+        self._patterns = {}
+        self._prefix_lengths = {}  # prefix length -> number of indexed prefixes
+        self._compiled = {}        # pattern -> compiled regex
+        # Replay buffers for channels matching PUBSUB_REPLAY_CHANNELS:
+        # channel -> [last sequence id, deque of recent messages], least recently published first
+        self._history = OrderedDict()
+        self._replay_patterns = [
+            re.compile(fnmatch.translate(pattern.strip()))
+            for pattern in settings.PUBSUB_REPLAY_CHANNELS.split(",")
+            if pattern.strip()
+        ]
+        self._policies = {}     # channel -> (OverflowPolicy, block timeout)
+        self._default_policy = (
+            OverflowPolicy(settings.PUBSUB_OVERFLOW_POLICY),
+            settings.PUBSUB_BLOCK_TIMEOUT,
+        )
+        self._stats = {
+            "delivered": 0, "dropped": 0, "lagging": 0, "disconnected": 0,
+            "expired": 0, "evicted": 0,
+        }
 
     # Key/Value operations
-    def set(self, key, value):
-        with self._lock:
-            self._data[key] = value
-            return True
+    def set(self, key, value, ex=None, px=None):
+        """Stores a value, optionally expiring after `ex` seconds or `px` milliseconds."""
+        self._remove(key)
+        self._data[key] = value
+        self._account(key)
+        if ex is not None or px is not None:
+            self._set_deadline(key, ex if ex is not None else px / 1000)
+        self._evict()
+        return True
 
     def get(self, key):
-        with self._lock:
-            return self._data.get(key)
+        value = self._lookup(key)
+        if isinstance(value, list):
+            raise TypeError(f"WRONGTYPE {key} holds a list")
+        return value
+
+    def delete(self, *keys):
+        return sum(1 for key in keys if self._lookup(key) is not None and self._remove(key))
+
+    def exists(self, key):
+        return 1 if self._lookup(key) is not None else 0
+
+    def expire(self, key, seconds):
+        """Sets a TTL on an existing key; returns 1 if the key exists."""
+        if self._lookup(key) is None:
+            return 0
+        self._set_deadline(key, seconds)
+        return 1
+
+    def ttl(self, key):
+        """Seconds left to live, -1 for keys without a TTL, -2 for missing keys."""
+        if self._lookup(key) is None:
+            return -2
+        deadline = self._expires.get(key)
+        if deadline is None:
+            return -1
+        return max(0, round(deadline - time.monotonic()))
+
+    # List operations
+    def lpush(self, key, *values):
+        items = self._list_for_write(key)
+        # Each value goes to the head in turn, so the last one ends up first
+        items[:0] = values[::-1]
+        return self._after_list_write(key, items, values)
+
+    def rpush(self, key, *values):
+        items = self._list_for_write(key)
+        items.extend(values)
+        return self._after_list_write(key, items, values)
+
+    def lrange(self, key, start, end):
+        """Items from `start` to `end` inclusive; negative indexes count from the tail."""
+        return _inclusive_slice(self._list(key), start, end)
+
+    def ltrim(self, key, start, end):
+        items = self._list(key)
+        if not items:
+            return True
+        # Resolve the kept range once so only the trimmed items are re-sized
+        first, stop, _ = slice(start, None if end == -1 else end + 1).indices(len(items))
+        if first >= stop:
+            self._remove(key)
+            return True
+        removed = sum(_item_sizeof(item) for item in items[:first]) + \
+            sum(_item_sizeof(item) for item in items[stop:])
+        del items[stop:]
+        del items[:first]
+        self._resize(key, -removed)
+        return True
+
+    def llen(self, key):
+        return len(self._list(key))
+
+    def _list(self, key):
+        value = self._lookup(key)
+        if value is None:
+            return []
+        if not isinstance(value, list):
+            raise TypeError(f"WRONGTYPE {key} does not hold a list")
+        return value
+
+    def _list_for_write(self, key):
+        items = self._list(key)
+        if key not in self._data:
+            self._data[key] = items
+            self._account(key)
+        return items
+
+    def _after_list_write(self, key, items, values):
+        # Only the pushed values are sized; re-summing the whole list made pushes O(n)
+        self._resize(key, sum(_item_sizeof(value) for value in values))
+        self._evict()
+        return len(items)
+
+    # Expiry and eviction
+    def _lookup(self, key):
+        """Returns a live value (marking it recently used), expiring it first if due."""
+        if key not in self._data:
+            return None
+        deadline = self._expires.get(key)
+        if deadline is not None and deadline <= time.monotonic():
+            self._remove(key)
+            self._stats["expired"] += 1
+            return None
+        self._data.move_to_end(key)
+        return self._data[key]
+
+    def _remove(self, key):
+        if key not in self._data:
+            return False
+        del self._data[key]
+        self._used_memory -= self._sizes.pop(key, 0)
+        self._expires.pop(key, None)
+        return True
+
+    def _account(self, key):
+        size = _sizeof(key, self._data[key])
+        self._used_memory += size - self._sizes.get(key, 0)
+        self._sizes[key] = size
+
+    def _resize(self, key, delta):
+        self._sizes[key] = self._sizes.get(key, 0) + delta
+        self._used_memory += delta
+
+    def _set_deadline(self, key, seconds):
+        deadline = time.monotonic() + seconds
+        self._expires[key] = deadline
+        heapq.heappush(self._expiry_heap, (deadline, key))
+        self._ensure_janitor()
+
+    def _evict(self):
+        """Drops least recently used keys until we are back under the memory cap."""
+        if not self._maxmemory:
+            return
+        while self._used_memory > self._maxmemory and self._data:
+            key = next(iter(self._data))
+            self._remove(key)
+            self._stats["evicted"] += 1
+
+    def _expire_due(self, limit=1000):
+        """Removes up to `limit` keys whose TTL has passed; returns how many."""
+        now = time.monotonic()
+        removed = 0
+        heap = self._expiry_heap
+        while heap and heap[0][0] <= now and removed < limit:
+            deadline, key = heapq.heappop(heap)
+            # Skip entries left behind by a newer TTL or a deleted key
+            if self._expires.get(key) == deadline:
+                self._remove(key)
+                self._stats["expired"] += 1
+                removed += 1
+        return removed
+
+    def _ensure_janitor(self):
+        if self._janitor is None or self._janitor.done():
+            loop = _running_loop()
+            if loop is not None:
+                self._janitor = loop.create_task(self._expire_periodically())
+
+    async def _expire_periodically(self):
+        while self._expires:
+            await asyncio.sleep(settings.REDIS_EXPIRY_INTERVAL)
+            self._expire_due()
 
     # Pub/Sub operations
-    def pubsub(self):
-        return FakePubSub(self)
-
-    def publish(self, channel, message):
-        """Publishes a message to all subscribers of a channel."""
-        with self._lock:
-            # Check if there are any subscribers for this channel
-            subscriber_ids = self._subscribers.get(channel, [])
-            if not subscriber_ids:
-                return 0
-
-            # Iterate over a copy of the list to avoid issues if a client unsubscribes
-            count = 0
-            for uid in list(subscriber_ids):
-                # Get the shared queue for this subscriber's unique ID
-                q = self._queues.get(uid)
-                if q:
-                    # Put the message in the subscriber's private queue
-                    q.put({"type": "message", "channel": channel, "data": message})
-                    count += 1
-            return count
-
-# --- End of user's multiprocessing-safe FakeRedis classes ---
-
-# Create a shared multiprocessing manager and a single FakeRedis instance.
-manager = multiprocessing.Manager()
-redis_client = FakeRedis(manager=manager)
\ No newline at end of file
+    def pubsub(self, capacity=None):
+        """Creates a subscriber whose queue holds at most `capacity` messages."""
+        return FakePubSub(self, capacity=capacity)
+
+    def set_channel_policy(self, channel, policy, timeout=None):
+        """Sets how publishes on `channel` treat subscribers whose queue is full."""
+        self._policies[channel] = (
+            OverflowPolicy(policy),
+            settings.PUBSUB_BLOCK_TIMEOUT if timeout is None else timeout,
+        )
+
+    def stats(self):
+        """Broker-wide delivery counters plus the current subscriber count."""
+        subscribers = {uid for subs in self._subscribers.values() for uid in subs}
+        patterns = 0
+        for bucket in self._patterns.values():
+            patterns += len(bucket)
+            for subs in bucket.values():
+                subscribers.update(subs)
+        return {
+            **self._stats,
+            "keys": len(self._data),
+            "used_memory": self._used_memory,
+            "channels": len(self._subscribers),
+            "replay_channels": len(self._history),
+            "patterns": patterns,
+            "subscribers": len(subscribers),
+        }
+
+    def _add_pattern(self, pattern, client):
+        prefix = _literal_prefix(pattern)
+        bucket = self._patterns.get(prefix)
+        if bucket is None:
+            bucket = self._patterns[prefix] = {}
+            self._prefix_lengths[len(prefix)] = self._prefix_lengths.get(len(prefix), 0) + 1
+        if pattern not in bucket:
+            self._compiled[pattern] = re.compile(fnmatch.translate(pattern))
+        bucket.setdefault(pattern, {})[client._unique_id] = client
+
+    def _remove_pattern(self, pattern, client):
+        prefix = _literal_prefix(pattern)
+        bucket = self._patterns.get(prefix)
+        if bucket is None or pattern not in bucket:
+            return
+        bucket[pattern].pop(client._unique_id, None)
+        if not bucket[pattern]:
+            del bucket[pattern]
+            self._compiled.pop(pattern, None)
+        if not bucket:
+            del self._patterns[prefix]
+            remaining = self._prefix_lengths[len(prefix)] - 1
+            if remaining:
+                self._prefix_lengths[len(prefix)] = remaining
+            else:
+                del self._prefix_lengths[len(prefix)]
+
+    def _matching_patterns(self, channel):
+        """Yields (pattern, subscribers) for every pattern that matches `channel`."""
+        for length in tuple(self._prefix_lengths):
+            if length > len(channel):
+                continue
+            bucket = self._patterns.get(channel[:length])
+            if not bucket:
+                continue
+            for pattern, subscribers in tuple(bucket.items()):
+                if self._compiled[pattern].match(channel):
+                    yield pattern, subscribers
+
+    def publish(self, channel, message, record=True):
+        """
+        Publishes a message to all subscribers of a channel. `record=False` keeps
+        it out of the channel's replay buffer (and gives it no seq), for
+        high-volume messages that late joiners don't need.
+        """
+        return self._fanout(channel, message, record)
+
+    def _fanout(self, channel, message, record=True):
+        """Delivers a message to this process's channel and pattern subscribers."""
+        # Record before checking for subscribers so late joiners can still replay it
+        extra = self._record(channel, message) if record else {}
+        subscribers = self._subscribers.get(channel)
+        if not subscribers and not self._patterns:
+            return 0
+
+        policy, timeout = self._policy_for(channel)
+        count = 0
+        if subscribers:
+            # One payload (and one encoded frame) is shared by every subscriber
+            payload = {"type": "message", "channel": channel, "data": message, "frame": message, **extra}
+            count += self._deliver_all(subscribers, payload, policy, timeout)
+        for pattern, pattern_subscribers in self._matching_patterns(channel):
+            payload = {"type": "pmessage", "pattern": pattern, "channel": channel, "data": message, "frame": message, **extra}
+            count += self._deliver_all(pattern_subscribers, payload, policy, timeout)
+        return count
+
+    def _policy_for(self, channel):
+        return self._policies.get(channel, self._default_policy)
+
+    # Replay buffers
+    def _record(self, channel, message):
+        """
+        Stamps a message on a replayable channel with the next sequence id and keeps it
+        in the channel's ring buffer. The id is also spliced into `frame`, the text
+        viewers send as is, so it is encoded once per message rather than per viewer.
+        Sequence ids are per process, so with the shm backend they only line up for
+        clients that reconnect to the same worker.
+        """
+        history = self._history.get(channel)
+        if history is None:
+            if not any(pattern.match(channel) for pattern in self._replay_patterns):
+                return {}
+            history = self._history[channel] = [0, deque(maxlen=settings.PUBSUB_REPLAY_SIZE)]
+            while len(self._history) > settings.PUBSUB_REPLAY_MAX_CHANNELS:
+                self._history.popitem(last=False)
+        else:
+            self._history.move_to_end(channel)
+
+        history[0] += 1
+        extra = {"seq": history[0], "ts": time.time(), "frame": with_field(message, "seq", history[0])}
+        history[1].append({"type": "message", "channel": channel, "data": message, **extra})
+        return extra
+
+    def replay(self, channel, after_seq=None, seconds=None):
+        """Buffered messages on `channel` newer than `after_seq` and/or the last `seconds`."""
+        history = self._history.get(channel)
+        if history is None:
+            return []
+        since = time.time() - seconds if seconds is not None else None
+        return [
+            message for message in history[1]
+            if (after_seq is None or message["seq"] > after_seq)
+            and (since is None or message["ts"] >= since)
+        ]
+
+    def last_seq(self, channel):
+        """Sequence id of the newest message published on `channel` (0 if none)."""
+        history = self._history.get(channel)
+        return history[0] if history else 0
+
+    def _deliver_all(self, subscribers, payload, policy, timeout):
+        # Iterate over a copy so a subscriber can unsubscribe while we fan out
+        count = 0
+        for client in tuple(subscribers.values()):
+            try:
+                client._deliver(payload, policy, timeout)
+                count += 1
+            except Exception as e:
+                print(f"Error delivering message on {payload['channel']}: {e}")
+        return count
+
+# --- End of in-process asyncio FakeRedis classes ---
+
+def create_redis_client():
+    """Builds the broker selected by BROKER_BACKEND ("local" or "shm")."""
+    if settings.BROKER_BACKEND == "shm":
+        from app.services.shm_broker import SharedMemoryRedis
+        return SharedMemoryRedis(
+            prefix=settings.BROKER_SHM_PREFIX,
+            slots=broker_worker_count(),
+            capacity=settings.BROKER_RING_SIZE,
+        )
+    return FakeRedis()
+
+
+def broker_worker_count():
+    """Number of uvicorn workers the broker backend can serve."""
+    if settings.BROKER_BACKEND != "shm":
+        # In-process pub/sub only reaches subscribers inside one worker
+        return 1
+    return settings.BROKER_WORKERS or max(1, os.cpu_count() or 1)
+
+
+# A single broker instance shared by every route in this worker.
+redis_client = create_redis_client()
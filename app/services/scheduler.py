@@ -0,0 +1,221 @@
+import asyncio
+import heapq
+import itertools
+import random
+import time
+from enum import IntEnum
+
+from google.genai import errors
+
+from app.core.config import settings
+from app.utils.limiter import CapacityError
+
+RETRYABLE_CODES = {429, 500, 503}
+
+
+class Priority(IntEnum):
+    LIVE = 0          # questions asked during a live meeting
+    INTERACTIVE = 1   # a user waiting on a chat response
+    BATCH = 2         # /batch items
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute up to `per_minute`; may go into debt."""
+    def __init__(self, per_minute):
+        self.per_minute = per_minute
+        self.level = float(per_minute)
+        self._updated = time.monotonic()
+
+    def _refill(self, now, scale):
+        rate = self.per_minute * scale / 60
+        self.level = min(self.per_minute, self.level + (now - self._updated) * rate)
+        self._updated = now
+
+    def wait_time(self, amount, now, scale=1.0):
+        """Seconds until `amount` units are available (0 when they are, or when unlimited)."""
+        if not self.per_minute:
+            return 0.0
+        self._refill(now, scale)
+        # Requests bigger than the whole bucket only need it to be full
+        missing = min(amount, self.per_minute) - self.level
+        return max(0.0, missing / (self.per_minute * scale / 60))
+
+    def take(self, amount):
+        if self.per_minute:
+            self.level -= amount
+
+
+def retry_after(error):
+    """Seconds the server asked us to wait, from Retry-After or the RetryInfo detail."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    value = headers.get("retry-after") if hasattr(headers, "get") else None
+    if value:
+        try:
+            return float(value)
+        except ValueError:
+            pass
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        for detail in details.get("error", {}).get("details", []) or []:
+            delay = detail.get("retryDelay") if isinstance(detail, dict) else None
+            if isinstance(delay, str) and delay.endswith("s"):
+                try:
+                    return float(delay[:-1])
+                except ValueError:
+                    pass
+    return None
+
+
+class GeminiScheduler:
+    """
+    Paces Gemini calls to a requests-per-minute and tokens-per-minute budget.
+
+    Callers wait in one queue ordered by Priority, so live and interactive work
+    is admitted ahead of batch items whenever the budget is short; a caller that
+    is not admitted within its class's max wait gets CapacityError. A 429/5xx
+    pauses admission for the server's retry-after (or an exponential backoff
+    with jitter) and halves the admission rate, which then recovers a little with
+    every success. Token usage is estimated up front and corrected from the
+    response's usage metadata.
+    """
+    def __init__(self, rpm=0, tpm=0, max_retries=3, base_backoff=1.0, max_backoff=30.0, max_wait=None):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_retries = max_retries
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.max_wait = max_wait or {Priority.LIVE: 5.0, Priority.INTERACTIVE: 5.0, Priority.BATCH: 60.0}
+        self.scale = 1.0
+        self._paused_until = 0.0
+        self._waiters = []            # heap of [priority, order, future, tokens]
+        self._order = itertools.count()
+        self._timer = None
+        self.metrics = {
+            priority.name.lower(): {"admitted": 0, "rejected": 0, "wait_ms_total": 0.0, "wait_ms_max": 0.0}
+            for priority in Priority
+        }
+        self.metrics["retries"] = 0
+        self.metrics["throttled"] = 0
+
+    async def admit(self, priority=Priority.INTERACTIVE, tokens=0):
+        """Waits until the call may go out; raises CapacityError past the class's max wait."""
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        heapq.heappush(self._waiters, [priority, next(self._order), future, tokens])
+        started = time.monotonic()
+        self._dispatch()
+        stats = self.metrics[Priority(priority).name.lower()]
+        try:
+            await asyncio.wait_for(future, self.max_wait[priority])
+        except asyncio.TimeoutError:
+            stats["rejected"] += 1
+            raise CapacityError(f"not admitted within {self.max_wait[priority]}s") from None
+        finally:
+            self._dispatch()   # our slot at the head may have been holding others back
+        waited = (time.monotonic() - started) * 1000
+        stats["admitted"] += 1
+        stats["wait_ms_total"] += waited
+        stats["wait_ms_max"] = max(stats["wait_ms_max"], waited)
+
+    def _dispatch(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        now = time.monotonic()
+        while self._waiters:
+            priority, _, future, tokens = self._waiters[0]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            # Strict priority: the head waits for budget before anything behind it
+            delay = max(
+                self._paused_until - now,
+                self.requests.wait_time(1, now, self.scale),
+                self.tokens.wait_time(tokens, now, self.scale),
+            )
+            if delay > 0:
+                self._timer = asyncio.get_running_loop().call_later(delay, self._dispatch)
+                return
+            heapq.heappop(self._waiters)
+            self.requests.take(1)
+            self.tokens.take(tokens)
+            future.set_result(None)
+
+    def record_usage(self, estimated, response):
+        """Corrects the token bucket with the tokens the call really used."""
+        usage = getattr(response, "usage_metadata", None)
+        used = getattr(usage, "total_token_count", None)
+        if used is not None:
+            self.tokens.take(used - estimated)
+
+    def backoff(self, error, attempt=0):
+        """Pauses admission after a throttling or overload error from Gemini."""
+        delay = retry_after(error)
+        if delay is None:
+            delay = min(self.max_backoff, self.base_backoff * 2 ** attempt) * random.uniform(0.5, 1.5)
+        self._paused_until = max(self._paused_until, time.monotonic() + delay)
+        self.scale = max(0.1, self.scale / 2)
+        self.metrics["throttled"] += 1
+        print(f"⏳ Gemini throttled ({getattr(error, 'code', '?')}), pausing {delay:.1f}s")
+
+    async def call(self, attempt, priority=Priority.INTERACTIVE, tokens=0):
+        """
+        Runs `attempt()` (a coroutine factory doing one Gemini call) once admitted,
+        retrying retryable API errors up to max_retries times.
+        """
+        for retry in range(self.max_retries + 1):
+            await self.admit(priority, tokens)
+            try:
+                response = await attempt()
+            except errors.APIError as e:
+                if e.code not in RETRYABLE_CODES:
+                    raise
+                self.backoff(e, retry)
+                if retry == self.max_retries:
+                    raise CapacityError(f"Gemini still returning {e.code} after {retry} retries") from e
+                self.metrics["retries"] += 1
+                continue
+            self.scale = min(1.0, self.scale + 0.05)
+            self.record_usage(tokens, response)
+            return response
+
+    def stats(self):
+        stats = {
+            "queued": sum(1 for waiter in self._waiters if not waiter[2].done()),
+            "rate_scale": round(self.scale, 2),
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 2),
+            "requests_available": round(self.requests.level, 1),
+            "tokens_available": round(self.tokens.level),
+            "retries": self.metrics["retries"],
+            "throttled": self.metrics["throttled"],
+        }
+        for priority in Priority:
+            metrics = self.metrics[priority.name.lower()]
+            stats[priority.name.lower()] = {
+                **{key: round(value, 1) for key, value in metrics.items()},
+                "wait_ms_avg": round(metrics["wait_ms_total"] / metrics["admitted"], 1) if metrics["admitted"] else 0.0,
+            }
+        return stats
+
+
+def estimate_tokens(contents):
+    """Rough input size: ~4 characters per token for text, a flat guess for anything else."""
+    total = 0
+    for content in contents:
+        for part in getattr(content, "parts", None) or [content]:
+            text = getattr(part, "text", None) if not isinstance(part, str) else part
+            total += len(text) // 4 + 1 if text else settings.GEMINI_TOKEN_ESTIMATE_PER_PART
+    return total
+
+
+gemini_scheduler = GeminiScheduler(
+    rpm=settings.GEMINI_RPM,
+    tpm=settings.GEMINI_TPM,
+    max_retries=settings.GEMINI_MAX_RETRIES,
+    max_wait={
+        Priority.LIVE: settings.GEMINI_MAX_WAIT_SECONDS,
+        Priority.INTERACTIVE: settings.GEMINI_MAX_WAIT_SECONDS,
+        Priority.BATCH: settings.GEMINI_BATCH_MAX_WAIT_SECONDS,
+    },
+)
@@ -0,0 +1,377 @@
+import errno
+import fcntl
+import os
+import struct
+import tempfile
+import threading
+from multiprocessing import shared_memory
+
+from app.services.redis_client import FakeRedis, _running_loop
+
+
+# Segment layout: a small header followed by the ring data.
+#   magic u32 | owner pid u32 | capacity u64 | write position u64 | position at claim u64
+_HEADER = struct.Struct("<IIQQQ")
+_HEADER_SIZE = 64
+_WRITE_POS = struct.Struct("<Q")
+_WRITE_POS_OFFSET = 16
+_MAGIC = 0x52494E47  # "RING"
+
+# Record layout: body length u32 | channel length u16 | kind u8, then channel + data.
+_RECORD = struct.Struct("<IHB")
+_WRAP = 0xFFFFFFFF
+_KIND_STR = 0
+_KIND_BYTES = 1
+_KIND_UNRECORDED = 0x80   # flag bit: keep the message out of replay buffers
+
+
+def _open_segment(name, create=False, size=0):
+    """
+    Opens a shared memory segment without handing it to the resource tracker,
+    which would otherwise unlink it when any worker that touched it exits.
+    """
+    try:
+        return shared_memory.SharedMemory(name=name, create=create, size=size, track=False)
+    except TypeError:
+        # Python < 3.13 has no `track` flag
+        segment = shared_memory.SharedMemory(name=name, create=create, size=size)
+        try:
+            from multiprocessing import resource_tracker
+            resource_tracker.unregister(segment._name, "shared_memory")
+        except Exception:
+            pass
+        return segment
+
+
+def _max_record(capacity):
+    """Largest record a ring accepts, small enough that readers can detect torn reads."""
+    return capacity // 8
+
+
+def _lock_slot(name):
+    """
+    Takes the slot's lock file, held for as long as this worker owns the ring.
+    The kernel releases it when the worker dies, so the lock (not the pid in the
+    header) decides ownership and two workers can never claim the same slot.
+    Returns the locked fd, or None if another worker holds it.
+    """
+    fd = os.open(os.path.join(tempfile.gettempdir(), f"{name}.lock"), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        os.close(fd)
+        return None
+    return fd
+
+
+class RingWriter:
+    """
+    Single-producer ring buffer owned by one worker.
+    Readers in other workers keep their own cursors, so writing never waits on them;
+    a reader that falls a full lap behind skips ahead and counts the loss.
+    """
+    def __init__(self, segment, lock_fd=None):
+        self.segment = segment
+        self.lock_fd = lock_fd
+        self.buf = segment.buf
+        _, _, self.capacity, self.write_pos, _ = _HEADER.unpack_from(self.buf, 0)
+        self.max_record = _max_record(self.capacity)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def claim(cls, name, capacity):
+        """
+        Creates the segment, or takes over one left behind by a dead worker;
+        None if a live worker owns the slot.
+        """
+        lock_fd = _lock_slot(name)
+        if lock_fd is None:
+            return None
+        try:
+            try:
+                segment = _open_segment(name, create=True, size=_HEADER_SIZE + capacity)
+                _HEADER.pack_into(segment.buf, 0, _MAGIC, os.getpid(), capacity, 0, 0)
+                return cls(segment, lock_fd)
+            except FileExistsError:
+                segment = _open_segment(name)
+                magic, _, existing_capacity, write_pos, _ = _HEADER.unpack_from(segment.buf, 0)
+                if magic != _MAGIC:
+                    existing_capacity, write_pos = segment.size - _HEADER_SIZE, 0
+                # Keep the old write position so readers' cursors stay valid
+                _HEADER.pack_into(segment.buf, 0, _MAGIC, os.getpid(), existing_capacity, write_pos, write_pos)
+                return cls(segment, lock_fd)
+        except Exception:
+            os.close(lock_fd)
+            raise
+
+    def write(self, channel, message, record=True):
+        """Appends one message; returns False if it can never fit in the ring."""
+        if isinstance(message, (bytes, bytearray, memoryview)):
+            kind, data = _KIND_BYTES, bytes(message)
+        else:
+            kind, data = _KIND_STR, str(message).encode("utf-8")
+        if not record:
+            kind |= _KIND_UNRECORDED
+        channel_bytes = channel.encode("utf-8")
+        body = len(channel_bytes) + len(data)
+        size = _RECORD.size + body
+        if size > self.max_record or len(channel_bytes) > 0xFFFF:
+            return False
+
+        with self._lock:
+            pos = self.write_pos
+            offset = pos % self.capacity
+            if offset + size > self.capacity:
+                # Records never straddle the end of the ring
+                if self.capacity - offset >= 4:
+                    struct.pack_into("<I", self.buf, _HEADER_SIZE + offset, _WRAP)
+                pos += self.capacity - offset
+                offset = 0
+
+            start = _HEADER_SIZE + offset
+            _RECORD.pack_into(self.buf, start, body, len(channel_bytes), kind)
+            start += _RECORD.size
+            self.buf[start:start + len(channel_bytes)] = channel_bytes
+            start += len(channel_bytes)
+            self.buf[start:start + len(data)] = data
+
+            # Publish the new position only after the record is fully written
+            self.write_pos = pos + size
+            _WRITE_POS.pack_into(self.buf, _WRITE_POS_OFFSET, self.write_pos)
+        return True
+
+    def close(self):
+        self.buf = None
+        self.segment.close()
+        if self.lock_fd is not None:
+            # Closing the fd releases the slot lock
+            os.close(self.lock_fd)
+            self.lock_fd = None
+
+
+class RingReader:
+    """
+    A cursor over another worker's ring.
+    `from_claim` starts at the position the owner claimed the ring at, so a worker
+    that appeared after we started is read from its first message.
+    """
+    def __init__(self, segment, from_claim=False):
+        self.segment = segment
+        self.buf = segment.buf
+        _, self.pid, self.capacity, write_pos, claim_pos = _HEADER.unpack_from(self.buf, 0)
+        self.cursor = claim_pos if from_claim else write_pos
+        self.max_record = _max_record(self.capacity)
+        self.lapped = 0
+
+    def _write_pos(self):
+        return _WRITE_POS.unpack_from(self.buf, _WRITE_POS_OFFSET)[0]
+
+    def _overrun(self, write_pos):
+        # Leave room for a record (plus wrap padding) the writer may be halfway through
+        return write_pos - self.cursor > self.capacity - 2 * self.max_record
+
+    def read(self):
+        """Yields (channel, message, record) for everything written since the last read."""
+        write_pos = self._write_pos()
+        if write_pos < self.cursor:
+            # Ring was re-created from scratch; start over from its current end
+            self.cursor = write_pos
+            return
+        if self._overrun(write_pos):
+            self.lapped += 1
+            self.cursor = write_pos
+            return
+
+        while self.cursor < write_pos:
+            offset = self.cursor % self.capacity
+            if self.capacity - offset < _RECORD.size:
+                self.cursor += self.capacity - offset
+                continue
+            start = _HEADER_SIZE + offset
+            body, channel_len, kind = _RECORD.unpack_from(self.buf, start)
+            if body == _WRAP:
+                self.cursor += self.capacity - offset
+                continue
+
+            start += _RECORD.size
+            channel = bytes(self.buf[start:start + channel_len])
+            data = bytes(self.buf[start + channel_len:start + body])
+
+            # The writer may have lapped us while we copied; drop the torn record
+            latest = self._write_pos()
+            if self._overrun(latest):
+                self.lapped += 1
+                self.cursor = latest
+                return
+
+            self.cursor += _RECORD.size + body
+            record = not kind & _KIND_UNRECORDED
+            kind &= ~_KIND_UNRECORDED
+            message = data.decode("utf-8") if kind == _KIND_STR else data
+            yield channel.decode("utf-8"), message, record
+
+    def close(self):
+        self.buf = None
+        self.segment.close()
+
+
+class SharedMemoryTransport:
+    """
+    Fans broker messages out across worker processes.
+
+    Every worker claims one slot and owns one ring buffer plus one named FIFO.
+    Publishing appends to the worker's own ring and writes a byte into each
+    peer's FIFO; peers wake up through the event loop, drain every ring and
+    deliver the messages to their local subscribers.
+    """
+    def __init__(self, prefix, slots, capacity, on_message):
+        self.prefix = prefix
+        self.slots = slots
+        self.capacity = capacity
+        self.on_message = on_message
+        self.slot = None
+        self.writer = None
+        self.readers = {}       # slot -> RingReader
+        self.wakeups = {}       # slot -> fifo write fd
+        self._fifo_fd = None
+        self._loop = None
+        self.dropped = 0
+
+    def _segment_name(self, slot):
+        return f"{self.prefix}_{slot}"
+
+    def _fifo_path(self, slot):
+        return os.path.join(tempfile.gettempdir(), f"{self.prefix}_{slot}.fifo")
+
+    def start(self, loop):
+        """Claims a free slot and starts listening for wakeups on `loop`."""
+        for slot in range(self.slots):
+            writer = RingWriter.claim(self._segment_name(slot), self.capacity)
+            if writer is not None:
+                self.slot, self.writer = slot, writer
+                break
+        if self.writer is None:
+            raise RuntimeError(f"No free broker slot out of {self.slots}; raise BROKER_WORKERS")
+
+        path = self._fifo_path(self.slot)
+        try:
+            os.mkfifo(path, 0o600)
+        except FileExistsError:
+            pass
+        # O_RDWR keeps the FIFO open even when no peer currently has it open for writing
+        self._fifo_fd = os.open(path, os.O_RDWR | os.O_NONBLOCK)
+        # Peers already running are read from their current end
+        for slot in range(self.slots):
+            if slot != self.slot:
+                self._reader(slot)
+        self._loop = loop
+        loop.add_reader(self._fifo_fd, self._on_wakeup)
+        print(f"🔗 Shared-memory broker slot {self.slot} ready (pid {os.getpid()})")
+
+    def send(self, channel, message, record=True):
+        if self.writer is None:
+            return
+        if not self.writer.write(channel, message, record):
+            self.dropped += 1
+            print(f"⚠ Message on {channel} is larger than the broker ring, not sent to other workers")
+            return
+        for slot in range(self.slots):
+            if slot != self.slot:
+                self._wake(slot)
+
+    def _wake(self, slot):
+        fd = self.wakeups.get(slot)
+        if fd is None:
+            try:
+                fd = os.open(self._fifo_path(slot), os.O_WRONLY | os.O_NONBLOCK)
+            except OSError:
+                # No worker is listening on that slot
+                return
+            self.wakeups[slot] = fd
+        try:
+            os.write(fd, b"\0")
+        except BlockingIOError:
+            # Peer already has unread wakeups pending
+            pass
+        except OSError as e:
+            if e.errno in (errno.EPIPE, errno.EBADF):
+                os.close(fd)
+                self.wakeups.pop(slot, None)
+
+    def _on_wakeup(self):
+        try:
+            while os.read(self._fifo_fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        self.drain()
+
+    def _reader(self, slot):
+        reader = self.readers.get(slot)
+        if reader is None:
+            try:
+                segment = _open_segment(self._segment_name(slot))
+            except FileNotFoundError:
+                return None
+            # Rings that show up after start() belong to workers that started after us
+            reader = self.readers[slot] = RingReader(segment, from_claim=self._loop is not None)
+        return reader
+
+    def drain(self):
+        """Delivers every pending message from the other workers' rings."""
+        for slot in range(self.slots):
+            if slot == self.slot:
+                continue
+            reader = self._reader(slot)
+            if reader is None:
+                continue
+            for channel, message, record in reader.read():
+                try:
+                    self.on_message(channel, message, record)
+                except Exception as e:
+                    print(f"⚠ Error delivering cross-worker message on {channel}: {e}")
+
+    def close(self):
+        if self._loop is not None and self._fifo_fd is not None:
+            self._loop.remove_reader(self._fifo_fd)
+        for fd in [self._fifo_fd, *self.wakeups.values()]:
+            if fd is not None:
+                os.close(fd)
+        self._fifo_fd = None
+        self.wakeups.clear()
+        for reader in self.readers.values():
+            reader.close()
+        self.readers.clear()
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class SharedMemoryRedis(FakeRedis):
+    """
+    FakeRedis whose publishes also reach subscribers in the other uvicorn workers.
+    Local subscribers are served exactly as before; the shared-memory transport
+    is started lazily the first time the broker is used inside an event loop.
+    """
+    def __init__(self, prefix, slots, capacity):
+        super().__init__()
+        self._transport = SharedMemoryTransport(prefix, slots, capacity, self._fanout)
+
+    def _ensure_started(self):
+        if self._transport._loop is None:
+            loop = _running_loop()
+            if loop is not None:
+                self._transport.start(loop)
+
+    def pubsub(self, capacity=None):
+        self._ensure_started()
+        return super().pubsub(capacity)
+
+    def publish(self, channel, message, record=True):
+        self._ensure_started()
+        count = self._fanout(channel, message, record)
+        self._transport.send(channel, message, record)
+        return count
+
+    def close(self):
+        self._transport.close()
@@ -0,0 +1,251 @@
+import asyncio
+import re
+from collections import OrderedDict, defaultdict
+
+from app.core.config import settings
+from app.core.db import SessionLocal
+from app.models.meeting_transcript import MeetingTranscript
+
+_WORD = re.compile(r"\w+")
+_SENTENCE_END = (".", "?", "!")
+
+
+def _terms(text):
+    return _WORD.findall(text.lower())
+
+
+class TranscriptAssembler:
+    """
+    Joins input transcription fragments into sentence-sized segments.
+    A segment closes when the server marks the transcription finished, when a
+    fragment ends a sentence, or when it grows past `max_chars`.
+    """
+    def __init__(self, max_chars=400):
+        self.max_chars = max_chars
+        self._parts = []
+        self._size = 0
+
+    def feed(self, text, finished=False):
+        """Returns the segment completed by this fragment, or None."""
+        if text:
+            self._parts.append(text)
+            self._size += len(text)
+        if finished or self._size >= self.max_chars or (text and text.rstrip().endswith(_SENTENCE_END)):
+            return self.flush()
+        return None
+
+    def flush(self):
+        segment = "".join(self._parts).strip()
+        self._parts = []
+        self._size = 0
+        return segment or None
+
+
+class TranscriptWriter:
+    """
+    Buffers transcript rows and writes them with one bulk insert per batch,
+    once `batch_size` rows are waiting or `flush_ms` after the oldest arrived.
+    The insert runs in a worker thread so the event loop never blocks on the DB.
+    A batch the DB rejects is retried row by row, so one bad row (e.g. a
+    duplicate seq) only loses itself. The flush task exits once nothing is
+    pending; add() starts it again.
+    """
+    def __init__(self, batch_size=20, flush_ms=2000, session_factory=SessionLocal):
+        self.batch_size = batch_size
+        self.flush_ms = flush_ms
+        self._session_factory = session_factory
+        self._pending = []
+        self._ready = asyncio.Event()
+        self._lock = asyncio.Lock()
+        self._task = None
+        self.rows_written = 0
+        self.batches = 0
+        self.rows_failed = 0
+
+    def add(self, row):
+        self._pending.append(row)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        if len(self._pending) >= self.batch_size:
+            self._ready.set()
+
+    async def _run(self):
+        while self._pending:
+            try:
+                await asyncio.wait_for(self._ready.wait(), self.flush_ms / 1000)
+            except asyncio.TimeoutError:
+                pass
+            self._ready.clear()
+            await self.flush()
+
+    async def flush(self):
+        """Writes everything buffered so far, after any write already in progress."""
+        async with self._lock:
+            if not self._pending:
+                return
+            rows, self._pending = self._pending, []
+            try:
+                await asyncio.to_thread(self._insert, rows)
+                self.rows_written += len(rows)
+                self.batches += 1
+                return
+            except Exception as e:
+                print(f"⚠ Failed to write {len(rows)} transcript segment(s) in one batch, retrying one by one: {str(e).splitlines()[0]}")
+            try:
+                failed = await asyncio.to_thread(self._insert_each, rows)
+            except Exception as e:
+                failed = len(rows)
+                print(f"⚠ Failed to write {len(rows)} transcript segment(s): {e}")
+            self.rows_written += len(rows) - failed
+            self.rows_failed += failed
+
+    def _insert(self, rows):
+        db = self._session_factory()
+        try:
+            db.bulk_insert_mappings(MeetingTranscript, rows)
+            db.commit()
+        finally:
+            db.close()
+
+    def _insert_each(self, rows):
+        """Inserts rows one at a time; returns how many were rejected."""
+        failed = 0
+        db = self._session_factory()
+        try:
+            for row in rows:
+                try:
+                    db.bulk_insert_mappings(MeetingTranscript, [row])
+                    db.commit()
+                except Exception as e:
+                    db.rollback()
+                    failed += 1
+                    print(f"⚠ Dropped transcript segment {row['meeting_id']}#{row['seq']}: {e.__class__.__name__}")
+        finally:
+            db.close()
+        return failed
+
+
+class TranscriptStore:
+    """
+    Live transcript segments per meeting: written through a TranscriptWriter
+    and kept in an in-memory inverted index (term -> segment positions) for
+    keyword search. Live meetings, from start() until finish(), are indexed,
+    the most recently used `max_meetings` of them at a time; any other meeting
+    is read from the database per request, without taking an index slot.
+    Sequence numbers of live meetings are tracked apart from the index, so a
+    meeting keeps numbering correctly after its index entry is evicted.
+    """
+    def __init__(self, writer, max_meetings=64, session_factory=SessionLocal):
+        self.writer = writer
+        self.max_meetings = max_meetings
+        self._session_factory = session_factory
+        self._meetings = OrderedDict()   # meeting_id -> {"segments": [...], "postings": {...}}
+        self._next_seq = {}              # meeting_id -> seq of its next segment
+
+    async def start(self, meeting_id):
+        """Indexes a live meeting's stored transcript and continues its numbering."""
+        entry = await self.open(meeting_id, live=True)
+        last = entry["segments"][-1]["seq"] if entry["segments"] else -1
+        self._next_seq[meeting_id] = max(self._next_seq.get(meeting_id, 0), last + 1)
+        return entry
+
+    async def open(self, meeting_id, live=False):
+        """A meeting's transcript, from the index or else from the database."""
+        if meeting_id in self._meetings:
+            self._meetings.move_to_end(meeting_id)
+            return self._meetings[meeting_id]
+        # Segments still waiting in the writer must be in the DB before we read it back
+        await self.writer.flush()
+        rows = await asyncio.to_thread(self._load, meeting_id)
+        if meeting_id in self._meetings:
+            return self._meetings[meeting_id]
+        entry = self._new_entry()
+        for seq, text in rows:
+            self._index(entry, seq, text)
+        # Segments recorded while we were reading are only in the writer's buffer
+        loaded = rows[-1][0] if rows else -1
+        for row in self.writer._pending:
+            if row["meeting_id"] == meeting_id and row["seq"] > loaded:
+                self._index(entry, row["seq"], row["text"])
+        if live or meeting_id in self._next_seq:
+            self._meetings[meeting_id] = entry
+            self._evict()
+        return entry
+
+    def record(self, meeting_id, text):
+        """Indexes a segment, queues it for the DB and returns its sequence number."""
+        seq = self._next_seq.get(meeting_id, 0)
+        self._next_seq[meeting_id] = seq + 1
+        entry = self._meetings.get(meeting_id)
+        if entry is not None:
+            self._meetings.move_to_end(meeting_id)
+            self._index(entry, seq, text)
+        # An evicted meeting is reindexed from the DB by the next open()
+        self.writer.add({"meeting_id": meeting_id, "seq": seq, "text": text})
+        return seq
+
+    def finish(self, meeting_id):
+        """Stops tracking a meeting once its live session is gone; later reads go to the DB."""
+        self._next_seq.pop(meeting_id, None)
+        self._meetings.pop(meeting_id, None)
+
+    async def segments(self, meeting_id):
+        entry = await self.open(meeting_id)
+        return list(entry["segments"])
+
+    async def search(self, meeting_id, query, limit=10):
+        """
+        Segments containing the query's words, best first: segments with more of
+        the distinct query terms rank higher, ties go to the most recent segment.
+        """
+        entry = await self.open(meeting_id)
+        terms = set(_terms(query))
+        if not terms:
+            return []
+        hits = defaultdict(int)
+        for term in terms:
+            for position in entry["postings"].get(term, ()):
+                hits[position] += 1
+        ranked = sorted(hits.items(), key=lambda item: (-item[1], -item[0]))[:limit]
+        segments = entry["segments"]
+        return [
+            {**segments[position], "matched": count, "terms": len(terms)}
+            for position, count in ranked
+        ]
+
+    async def flush(self):
+        await self.writer.flush()
+
+    def _new_entry(self):
+        return {"segments": [], "postings": defaultdict(list)}
+
+    def _index(self, entry, seq, text):
+        position = len(entry["segments"])
+        entry["segments"].append({"seq": seq, "text": text})
+        for term in set(_terms(text)):
+            entry["postings"][term].append(position)
+
+    def _evict(self):
+        while len(self._meetings) > self.max_meetings:
+            self._meetings.popitem(last=False)
+
+    def _load(self, meeting_id):
+        db = self._session_factory()
+        try:
+            return (
+                db.query(MeetingTranscript.seq, MeetingTranscript.text)
+                .filter(MeetingTranscript.meeting_id == meeting_id)
+                .order_by(MeetingTranscript.seq)
+                .all()
+            )
+        finally:
+            db.close()
+
+
+transcripts = TranscriptStore(
+    TranscriptWriter(
+        batch_size=settings.TRANSCRIPT_BATCH_SIZE,
+        flush_ms=settings.TRANSCRIPT_FLUSH_MS,
+    ),
+    max_meetings=settings.TRANSCRIPT_INDEX_MAX_MEETINGS,
+)
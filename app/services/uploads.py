@@ -0,0 +1,71 @@
+import asyncio
+import hashlib
+
+from fastapi import UploadFile
+from google.genai.types import Part, UploadFileConfig
+
+from app.core.config import settings
+from app.services.gemini_client import google_client
+from app.utils.cache import ResponseCache
+
+# sha256 of an uploaded document -> the Gemini File holding it. Entries expire a
+# little before Gemini deletes uploaded files (48 hours).
+uploaded_files = ResponseCache(
+    max_entries=settings.GEMINI_FILE_CACHE_SIZE,
+    ttl_seconds=settings.GEMINI_FILE_TTL_SECONDS,
+)
+
+
+async def hash_upload(file: UploadFile):
+    """
+    Streams the upload in UPLOAD_CHUNK_SIZE chunks to compute its sha256.
+    Starlette already spools request files to a temporary file past 1 MB, so
+    this never holds more than one chunk in memory. Returns (hexdigest, size)
+    with the file rewound.
+    """
+    digest = hashlib.sha256()
+    size = 0
+    await file.seek(0)
+    while True:
+        chunk = await file.read(settings.UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        digest.update(chunk)
+        size += len(chunk)
+    await file.seek(0)
+    return digest.hexdigest(), size
+
+
+async def _upload(file: UploadFile, mime_type: str):
+    uploaded = await google_client.aio.files.upload(
+        file=file.file,
+        config=UploadFileConfig(mime_type=mime_type, display_name=file.filename),
+    )
+    # Documents are usually ACTIVE right away; audio and video need processing first
+    deadline = asyncio.get_running_loop().time() + settings.GEMINI_FILE_PROCESSING_TIMEOUT
+    while uploaded.state is not None and uploaded.state.name == "PROCESSING":
+        if asyncio.get_running_loop().time() > deadline:
+            raise TimeoutError(f"Gemini is still processing {uploaded.name}")
+        await asyncio.sleep(1)
+        uploaded = await google_client.aio.files.get(name=uploaded.name)
+    if uploaded.state is not None and uploaded.state.name == "FAILED":
+        raise RuntimeError(f"Gemini could not process {uploaded.name}: {uploaded.error}")
+    print(f"📎 Uploaded {file.filename} to Gemini as {uploaded.name}")
+    return uploaded
+
+
+async def file_part(file: UploadFile):
+    """
+    The Part to send for an uploaded file, with the file's sha256 and size.
+    Small files go inline; larger ones are uploaded once through the Files API
+    and later requests for the same content only send a reference to it.
+    """
+    mime_type = file.content_type
+    digest, size = await hash_upload(file)
+    if size <= settings.UPLOAD_INLINE_MAX_BYTES:
+        return Part.from_bytes(data=await file.read(), mime_type=mime_type), digest, size
+
+    uploaded = await uploaded_files.get_or_compute(
+        f"{digest}:{mime_type}", lambda: _upload(file, mime_type)
+    )
+    return Part.from_uri(file_uri=uploaded.uri, mime_type=uploaded.mime_type or mime_type), digest, size
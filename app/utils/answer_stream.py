@@ -0,0 +1,34 @@
+class MarkerSplitter:
+    """
+    Splits a streamed reply on an end-of-turn marker such as "|end|".
+    Each chunk is scanned once; only a trailing piece that could be the start of
+    a marker split across chunks is held back, so text can be forwarded as soon
+    as it arrives and the total work stays linear in the reply length.
+    """
+    def __init__(self, marker="|end|"):
+        self.marker = marker
+        self._tail = ""
+
+    def feed(self, text):
+        """Returns [(text, turn_complete), ...] for everything that is safe to emit."""
+        data = self._tail + text
+        events = []
+        while True:
+            index = data.find(self.marker)
+            if index < 0:
+                break
+            events.append((data[:index], True))
+            data = data[index + len(self.marker):]
+
+        hold = self._partial_marker(data)
+        self._tail = data[len(data) - hold:] if hold else ""
+        if len(data) > hold:
+            events.append((data[:len(data) - hold], False))
+        return events
+
+    def _partial_marker(self, data):
+        """Length of the longest suffix of `data` that is a proper prefix of the marker."""
+        for size in range(min(len(self.marker) - 1, len(data)), 0, -1):
+            if self.marker.startswith(data[-size:]):
+                return size
+        return 0
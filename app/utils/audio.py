@@ -0,0 +1,291 @@
+import asyncio
+import struct
+import time
+from collections import deque
+from math import gcd
+
+import numpy as np
+
+# Binary audio frames are either raw PCM or this fixed header followed by PCM:
+#   magic b"AUD0" | sequence number u32 (little endian)
+AUDIO_FRAME_MAGIC = b"AUD0"
+AUDIO_FRAME_HEADER = struct.Struct("<4sI")
+
+
+def audio_payload(frame):
+    """Returns the PCM part of a binary WebSocket frame as a memoryview, without copying."""
+    view = memoryview(frame)
+    if len(view) >= AUDIO_FRAME_HEADER.size and view[:4] == AUDIO_FRAME_MAGIC:
+        return view[AUDIO_FRAME_HEADER.size:]
+    return view
+
+
+class PcmBuffer:
+    """
+    Preallocated ring of PCM bytes between the WebSocket reader and Gemini.
+    Frames are copied in once through memoryviews and read out as one bytes
+    object per send. When the ring is full the oldest audio is overwritten.
+    """
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self._buf = bytearray(capacity)
+        self._view = memoryview(self._buf)
+        self._start = 0
+        self._size = 0
+        self._readable = asyncio.Event()
+        self.dropped_bytes = 0
+
+    def __len__(self):
+        return self._size
+
+    def write(self, data):
+        """Copies `data` (any bytes-like object) into the ring."""
+        data = memoryview(data).cast("B")
+        if len(data) >= self.capacity:
+            # Only the newest `capacity` bytes can be kept
+            self.dropped_bytes += self._size + len(data) - self.capacity
+            data = data[len(data) - self.capacity:]
+            self._start, self._size = 0, 0
+
+        overflow = self._size + len(data) - self.capacity
+        if overflow > 0:
+            self._start = (self._start + overflow) % self.capacity
+            self._size -= overflow
+            self.dropped_bytes += overflow
+
+        end = (self._start + self._size) % self.capacity
+        first = min(len(data), self.capacity - end)
+        self._view[end:end + first] = data[:first]
+        if first < len(data):
+            self._view[:len(data) - first] = data[first:]
+        self._size += len(data)
+        self._readable.set()
+
+    def read(self, max_bytes=None):
+        """Removes and returns up to `max_bytes` (default everything) as bytes."""
+        count = self._size if max_bytes is None else min(max_bytes, self._size)
+        start = self._start
+        first = min(count, self.capacity - start)
+        if first == count:
+            chunk = bytes(self._view[start:start + count])
+        else:
+            chunk = b"".join((self._view[start:], self._view[:count - first]))
+        self._start = (start + count) % self.capacity
+        self._size -= count
+        if not self._size:
+            self._readable.clear()
+        return chunk
+
+    async def wait_readable(self):
+        await self._readable.wait()
+
+
+class JitterBuffer(PcmBuffer):
+    """
+    Bounded PCM buffer that hands Gemini fixed-duration frames.
+    Small client chunks are coalesced into `frame_ms` frames (a shorter frame is
+    flushed if no more audio arrives within one frame's time). Once more than
+    `max_ms` of audio is queued, "catchup" drops the oldest audio to stay live
+    and "drop" discards the incoming audio instead. `frame_ms` is clamped to at
+    least MIN_FRAME_MS.
+    """
+    MIN_FRAME_MS = 10
+
+    def __init__(self, frame_ms=100, max_ms=2000, policy="catchup",
+                 sample_rate=16000, sample_width=2, channels=1):
+        self.bytes_per_ms = sample_rate * sample_width * channels / 1000
+        self.align = sample_width * channels
+        self.frame_ms = max(self.MIN_FRAME_MS, frame_ms)
+        # Never below one sample, or next_frame would return nothing forever
+        self.frame_bytes = max(self.align, self._aligned(self.frame_ms * self.bytes_per_ms))
+        self.policy = policy
+        super().__init__(max(self.frame_bytes, self._aligned(max_ms * self.bytes_per_ms)))
+        self._wrote = asyncio.Event()
+        self._arrivals = deque()   # (stream offset a write ended at, arrival time)
+        self._written = 0          # bytes accepted into the buffer
+        self._consumed = 0         # bytes read out or dropped from the head
+        self.frames_out = 0
+        self.max_depth = 0
+        self.lag_ms = 0.0
+        self.avg_lag_ms = 0.0
+
+    def _aligned(self, size):
+        return int(size) // self.align * self.align
+
+    def write(self, data):
+        data = memoryview(data).cast("B")
+        if self.policy == "drop":
+            free = self.capacity - len(self)
+            if len(data) > free:
+                self.dropped_bytes += len(data) - free
+                data = data[:free]
+        if not len(data):
+            return
+
+        dropped = self.dropped_bytes
+        super().write(data)
+        # Whatever catch-up overwrote at the head counts as consumed
+        self._consumed += self.dropped_bytes - dropped
+        self._written += len(data)
+        self._arrivals.append((self._written, time.monotonic()))
+        self.max_depth = max(self.max_depth, len(self))
+        self._wrote.set()
+
+    async def next_frame(self):
+        """Waits for a full frame, or for a frame's time to pass, and returns it as bytes."""
+        while True:
+            if len(self) < self.frame_bytes:
+                self._wrote.clear()
+                if len(self) < self.align:
+                    await self._wrote.wait()
+                    continue
+                try:
+                    await asyncio.wait_for(self._wrote.wait(), self.frame_ms / 1000)
+                    continue
+                except asyncio.TimeoutError:
+                    pass  # flush the partial frame
+            count = self._aligned(min(len(self), self.frame_bytes))
+            if count:
+                return self._take(count)
+
+    def _take(self, count):
+        start = self._consumed
+        while self._arrivals and self._arrivals[0][0] <= start:
+            self._arrivals.popleft()
+        if self._arrivals:
+            self.lag_ms = (time.monotonic() - self._arrivals[0][1]) * 1000
+            self.avg_lag_ms += (self.lag_ms - self.avg_lag_ms) * 0.1
+        self._consumed += count
+        self.frames_out += 1
+        return self.read(count)
+
+    def metrics(self):
+        """Queue depth, drops and lag, all in milliseconds of audio or wall time."""
+        return {
+            "depth_ms": round(len(self) / self.bytes_per_ms),
+            "max_depth_ms": round(self.max_depth / self.bytes_per_ms),
+            "frames_out": self.frames_out,
+            "bytes_in": self._written,
+            "dropped_ms": round(self.dropped_bytes / self.bytes_per_ms),
+            "lag_ms": round(self.lag_ms, 1),
+            "avg_lag_ms": round(self.avg_lag_ms, 1),
+        }
+
+
+class PcmConverter:
+    """
+    Normalizes client audio to the 16 kHz mono int16 PCM Gemini Live expects.
+
+    The client format (rate, channel count, s16le or f32le samples) is fixed once
+    per connection. Each chunk is then decoded, downmixed and run through a
+    polyphase low-pass resampler in one vectorized pass; filter history carries
+    over between chunks so chunk boundaries are seamless. Work and output arrays
+    are reused, so the returned memoryview is only valid until the next call.
+    """
+    def __init__(self, sample_rate=16000, channels=1, encoding="s16le",
+                 target_rate=16000, taps_per_phase=32):
+        if encoding not in ("s16le", "f32le"):
+            raise ValueError(f"Unsupported audio encoding: {encoding}")
+        for name, value in (("sample_rate", sample_rate), ("channels", channels), ("target_rate", target_rate)):
+            if not isinstance(value, int) or value <= 0:
+                raise ValueError(f"{name} must be a positive integer, got {value!r}")
+        self.channels = channels
+        self.encoding = encoding
+        self.dtype = np.dtype("<i2") if encoding == "s16le" else np.dtype("<f4")
+        self.frame_size = self.dtype.itemsize * channels
+        self.passthrough = sample_rate == target_rate and channels == 1 and encoding == "s16le"
+
+        factor = gcd(sample_rate, target_rate)
+        self.up = target_rate // factor
+        self.down = sample_rate // factor
+        self.taps = taps_per_phase if (self.up, self.down) != (1, 1) else 1
+        self._phases = self._design_filter()
+        self._offsets = np.arange(self.taps)
+
+        self._pending = b""        # bytes of a sample frame split across chunks
+        self._history = np.zeros(self.taps - 1, dtype=np.float32)
+        self._consumed = 0         # input samples seen so far
+        self._next_out = 0         # index of the next output sample
+        self._ext = np.empty(0, dtype=np.float32)
+        self._gather = np.empty((0, self.taps), dtype=np.float32)
+        self._coef = np.empty((0, self.taps), dtype=np.float32)
+        self._mixed = np.empty(0, dtype=np.float32)
+        self._out = np.empty(0, dtype=np.int16)
+
+    def _design_filter(self):
+        """Kaiser-windowed sinc low-pass, split into `up` phases of `taps` coefficients."""
+        if self.taps == 1:
+            return np.ones((1, 1), dtype=np.float32)
+        length = self.taps * self.up
+        # Cycles per sample at the upsampled rate, a little under the output Nyquist
+        cutoff = 0.45 / max(self.up, self.down)
+        n = np.arange(length) - (length - 1) / 2
+        h = 2 * cutoff * np.sinc(2 * cutoff * n) * np.kaiser(length, 8.0)
+        h *= self.up / h.sum()                   # unity gain after zero-stuffing
+        return h.reshape(self.taps, self.up).T.astype(np.float32).copy()
+
+    @staticmethod
+    def _grow(array, rows, *shape):
+        return array if len(array) >= rows else np.empty((rows, *shape), dtype=array.dtype)
+
+    def convert(self, data):
+        """Converts one chunk of client audio; returns 16 kHz mono int16 PCM."""
+        if self.passthrough:
+            return data
+        raw = memoryview(data).cast("B")
+        if self._pending:
+            raw = memoryview(self._pending + bytes(raw))
+        usable = len(raw) - len(raw) % self.frame_size
+        self._pending = bytes(raw[usable:])
+        if not usable:
+            return b""
+        samples = np.frombuffer(raw[:usable], dtype=self.dtype)
+
+        # Downmix to mono (and scale float input to the int16 range) in float32
+        frames = usable // self.frame_size
+        self._mixed = self._grow(self._mixed, frames)
+        mixed = self._mixed[:frames]
+        if self.channels > 1:
+            np.mean(samples.reshape(frames, self.channels), axis=1, dtype=np.float32, out=mixed)
+        else:
+            mixed[:] = samples
+        if self.encoding == "f32le":
+            mixed *= 32767.0
+
+        resampled = self._resample(mixed)
+        self._out = self._grow(self._out, len(resampled))
+        out = self._out[:len(resampled)]
+        np.clip(np.rint(resampled, out=resampled), -32768, 32767, out=resampled)
+        out[:] = resampled
+        return memoryview(out).cast("B")
+
+    def _resample(self, mixed):
+        if self.taps == 1:
+            return mixed
+        keep = self.taps - 1
+        count = len(mixed)
+        self._ext = self._grow(self._ext, keep + count)
+        ext = self._ext[:keep + count]
+        ext[:keep] = self._history
+        ext[keep:] = mixed
+        first = self._consumed - keep            # absolute index of ext[0]
+        last = self._consumed + count - 1        # absolute index of the newest sample
+
+        # Every output sample whose newest input sample has already arrived
+        end = ((last + 1) * self.up + self.down - 1) // self.down
+        positions = np.arange(self._next_out, end) * self.down
+        rows = len(positions)
+        bases = positions // self.up - first
+        phases = positions % self.up
+
+        self._gather = self._grow(self._gather, rows, self.taps)
+        self._coef = self._grow(self._coef, rows, self.taps)
+        window = np.take(ext, bases[:, None] - self._offsets, out=self._gather[:rows])
+        coef = np.take(self._phases, phases, axis=0, out=self._coef[:rows])
+        np.multiply(window, coef, out=window)
+        resampled = window.sum(axis=1)
+
+        self._history[:] = ext[len(ext) - keep:]
+        self._consumed += count
+        self._next_out = end
+        return resampled
@@ -0,0 +1,79 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+
+
+def cache_key(*parts):
+    """Stable digest of the JSON form of `parts` (anything json can't encode is repr'd)."""
+    raw = json.dumps(parts, sort_keys=True, default=repr, separators=(",", ":"))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResponseCache:
+    """
+    In-memory cache of computed responses with a TTL and LRU eviction beyond
+    `max_entries`. get_or_compute() is single-flight: concurrent callers for a
+    key that is being computed await the same task instead of starting their own.
+    Failures are not cached; everyone waiting on the failed task gets the error.
+    """
+    def __init__(self, max_entries=1024, ttl_seconds=600):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()    # key -> (expires_at, value)
+        self._inflight = {}
+        self.counters = {"hits": 0, "misses": 0, "shared": 0, "evictions": 0, "expired": 0}
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.counters["expired"] += 1
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value):
+        self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.counters["evictions"] += 1
+
+    async def get_or_compute(self, key, compute):
+        """
+        Returns the cached value for `key`, or awaits compute() once for all
+        concurrent callers. compute() may return None to skip caching the result.
+        """
+        value = self.get(key)
+        if value is not None:
+            self.counters["hits"] += 1
+            return value
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.counters["shared"] += 1
+        else:
+            self.counters["misses"] += 1
+            task = self._inflight[key] = asyncio.ensure_future(compute())
+            task.add_done_callback(lambda done: self._finish(key, done))
+        # A caller going away must not cancel the call the others are waiting on
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        self._inflight.pop(key, None)
+        if not task.cancelled() and task.exception() is None and task.result() is not None:
+            self.set(key, task.result())
+
+    def stats(self):
+        return {
+            **self.counters,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+        }
@@ -0,0 +1,51 @@
+import json
+
+from fastapi.responses import JSONResponse as _StdJSONResponse
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; the standard library encoder is the fallback
+    orjson = None
+
+
+if orjson is not None:
+    def dumps(obj):
+        return orjson.dumps(obj).decode()
+
+    def loads(data):
+        return orjson.loads(data)
+
+    def dump_bytes(obj):
+        return orjson.dumps(obj)
+else:
+    def dumps(obj):
+        return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+    def loads(data):
+        return json.loads(data)
+
+    def dump_bytes(obj):
+        return dumps(obj).encode("utf-8")
+
+
+def with_field(frame, key, value):
+    """
+    Adds `key` to an encoded JSON object without decoding it. The key is appended
+    last, so it wins over an existing key of the same name when the frame is parsed.
+    Frames that are not JSON objects are returned unchanged.
+    """
+    if not isinstance(frame, str):
+        return frame
+    body = frame.rstrip()
+    if not body.startswith("{") or not body.endswith("}"):
+        return frame
+    field = f"{dumps(key)}:{dumps(value)}"
+    if body[1:-1].strip():
+        return f"{body[:-1]},{field}}}"
+    return f"{{{field}}}"
+
+
+class JSONResponse(_StdJSONResponse):
+    """JSONResponse rendered with orjson when it is installed."""
+    def render(self, content):
+        return dump_bytes(content)
@@ -0,0 +1,46 @@
+import asyncio
+from contextlib import asynccontextmanager
+
+
+class CapacityError(Exception):
+    """Raised when no slot frees up within the limiter's wait timeout."""
+
+
+class ConcurrencyLimiter:
+    """
+    Caps how many calls run at once. Callers beyond `limit` wait up to
+    `wait_timeout` seconds for a slot and then get CapacityError, so a burst
+    is turned away quickly instead of queueing without bound.
+    """
+    def __init__(self, limit, wait_timeout):
+        self.limit = limit
+        self.wait_timeout = wait_timeout
+        self._semaphore = asyncio.Semaphore(limit)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        self.waiting += 1
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), self.wait_timeout)
+        except asyncio.TimeoutError:
+            self.rejected += 1
+            raise CapacityError(f"no free slot within {self.wait_timeout}s") from None
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self):
+        return {
+            "limit": self.limit,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,18 @@
+import asyncio
+
+
+async def run_until_first_done(*coros):
+    """
+    Runs coroutines side by side; once one finishes, cancels the others and waits
+    for them. Returns what the first finished coroutine returned, or re-raises
+    its exception.
+    """
+    tasks = [asyncio.create_task(coro) for coro in coros]
+    try:
+        done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    first = next(task for task in tasks if task in done)
+    return first.result()
@@ -0,0 +1,105 @@
+from collections import deque
+
+import numpy as np
+
+
+MODES = ("drop", "thin")
+
+
+class VoiceActivityDetector:
+    """
+    Energy + zero-crossing voice activity detection over 16-bit mono PCM frames.
+
+    Each frame is split into short windows that are scored in one vectorized pass:
+    a window is speech when it is loud enough and its zero-crossing rate is not
+    noise-like (very loud windows count regardless, to keep fricatives). After
+    speech, `hangover_ms` of trailing audio is still sent, and up to `padding_ms`
+    of the silence before speech is sent ahead of it so word onsets survive.
+
+    Silent frames are dropped entirely ("drop") or thinned to one in
+    `keep_every` ("thin") so the upstream stream never goes fully quiet.
+    """
+    def __init__(self, sample_rate=16000, window_ms=20, threshold_db=-45.0, zcr_max=0.35,
+                 hangover_ms=500, padding_ms=200, mode="drop", keep_every=10):
+        if mode not in MODES:
+            raise ValueError(f"Unsupported VAD mode: {mode!r} (expected one of {', '.join(MODES)})")
+        self.sample_rate = sample_rate
+        self.window = max(1, sample_rate * window_ms // 1000)
+        self.threshold_db = threshold_db
+        self.zcr_max = zcr_max
+        self.hangover_ms = hangover_ms
+        self.padding_ms = padding_ms
+        self.mode = mode
+        self.keep_every = max(1, keep_every)
+        self._hangover_left = 0.0
+        self._padding = deque()
+        self._padding_ms = 0.0
+        self._silent_run = 0
+        self.stats = {"frames_in": 0, "frames_out": 0, "speech_frames": 0, "bytes_suppressed": 0}
+
+    def is_speech(self, samples):
+        """Scores int16 samples window by window; True if any window holds speech."""
+        count = len(samples) // self.window
+        if count == 0:
+            windows = samples.reshape(1, -1)
+        else:
+            windows = samples[:count * self.window].reshape(count, self.window)
+        windows = windows.astype(np.float32) * (1.0 / 32768.0)
+
+        energy_db = 10.0 * np.log10(np.mean(windows * windows, axis=1) + 1e-10)
+        signs = np.signbit(windows)
+        zcr = np.count_nonzero(signs[:, 1:] != signs[:, :-1], axis=1) / max(1, windows.shape[1] - 1)
+
+        voiced = (energy_db > self.threshold_db) & (zcr < self.zcr_max)
+        loud = energy_db > self.threshold_db + 15.0
+        return bool(np.any(voiced | loud))
+
+    def process(self, frame):
+        """Returns the frames to forward for one incoming PCM frame (possibly none)."""
+        self.stats["frames_in"] += 1
+        samples = np.frombuffer(frame, dtype="<i2")
+        if not len(samples):
+            return []
+        duration_ms = len(samples) * 1000 / self.sample_rate
+
+        if self.is_speech(samples):
+            self.stats["speech_frames"] += 1
+            self._hangover_left = self.hangover_ms
+            self._silent_run = 0
+            out = list(self._padding)
+            out.append(frame)
+            self._clear_padding()
+            return self._emit(out)
+
+        if self._hangover_left > 0:
+            self._hangover_left -= duration_ms
+            return self._emit([frame])
+
+        self._silent_run += 1
+        if self.mode == "thin" and self._silent_run % self.keep_every == 0:
+            # The padding kept so far is older than this frame; sending it too would repeat audio
+            self._suppress_padding()
+            return self._emit([frame])
+
+        self._padding.append(frame)
+        self._padding_ms += duration_ms
+        while self._padding and self._padding_ms - self._frame_ms(self._padding[0]) >= self.padding_ms:
+            dropped = self._padding.popleft()
+            self._padding_ms -= self._frame_ms(dropped)
+            self.stats["bytes_suppressed"] += len(dropped)
+        return []
+
+    def _frame_ms(self, frame):
+        return len(frame) * 500 / self.sample_rate  # 2 bytes per sample
+
+    def _emit(self, frames):
+        self.stats["frames_out"] += len(frames)
+        return frames
+
+    def _clear_padding(self):
+        self._padding.clear()
+        self._padding_ms = 0.0
+
+    def _suppress_padding(self):
+        self.stats["bytes_suppressed"] += sum(len(frame) for frame in self._padding)
+        self._clear_padding()
@@ -1,9 +1,11 @@
 import uvicorn
-import os
+from app.services.redis_client import broker_worker_count
 
-safe_core=max(1,os.cpu_count())
-safe_core=1
+# Multiple workers need the shared-memory broker (BROKER_BACKEND=shm) so meeting
+# channels reach subscribers in every worker; the local broker pins us to one.
+safe_core=broker_worker_count()
 print(f"Ruuning Cpu Count will be {safe_core}")
 
 if __name__=="__main__":
-    uvicorn.run("app.app:app",host="0.0.0.0",port=10000,workers=safe_core,reload=True)
\ No newline at end of file
+    # uvicorn ignores `workers` when reloading, so only reload in single-worker mode
+    uvicorn.run("app.app:app",host="0.0.0.0",port=10000,workers=safe_core,reload=safe_core==1)
\ No newline at end of file
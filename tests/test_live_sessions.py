@@ -0,0 +1,72 @@
+import asyncio
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+from app.services import live_sessions
+from app.services.live_sessions import MeetingSession
+from app.utils.audio import JitterBuffer
+
+
+class FailingSession:
+    """A live session whose receive stream breaks straight away."""
+    async def send_realtime_input(self, **kwargs):
+        pass
+
+    async def receive(self):
+        raise ConnectionError("socket closed")
+        yield
+
+
+class GoAwaySession(FailingSession):
+    """A live session whose server immediately asks us to move."""
+    async def receive(self):
+        yield SimpleNamespace(session_resumption_update=None, go_away=object())
+
+
+def run_meeting(monkeypatch, session_type, until, max_reconnects=3):
+    """Runs a meeting against `session_type` until `until(connects)`; returns (meeting, connects, backoffs)."""
+    monkeypatch.setattr(live_sessions.settings, "LIVE_MAX_RECONNECTS", max_reconnects)
+    monkeypatch.setattr(live_sessions.settings, "TRANSCRIPT_ENABLED", False)
+    connects, backoffs = [], []
+    real_sleep = asyncio.sleep
+
+    @asynccontextmanager
+    async def connect(model, config):
+        connects.append(model)
+        yield session_type()
+
+    async def fast_sleep(delay, *args):
+        if delay:
+            backoffs.append(delay)
+        await real_sleep(0)
+
+    async def main():
+        monkeypatch.setattr(asyncio, "sleep", fast_sleep)
+        meeting = MeetingSession("test", {}, connect, JitterBuffer())
+        meeting.start()
+        try:
+            for _ in range(1000):
+                if meeting.closed.is_set() or until(connects):
+                    break
+                await real_sleep(0)
+        finally:
+            monkeypatch.undo()
+            await meeting.close()
+        return meeting
+
+    return asyncio.run(main()), connects, backoffs
+
+
+def test_failed_sessions_back_off_and_give_up(monkeypatch):
+    meeting, connects, backoffs = run_meeting(monkeypatch, FailingSession, lambda connects: False)
+    assert meeting.closed.is_set()
+    # The first connect plus LIVE_MAX_RECONNECTS retries, each after a growing backoff
+    assert len(connects) == 4
+    assert backoffs == [0.5, 1.0, 2.0]
+
+
+def test_go_away_reconnects_straight_away(monkeypatch):
+    meeting, connects, backoffs = run_meeting(monkeypatch, GoAwaySession, lambda connects: len(connects) >= 10)
+    assert len(connects) >= 10
+    assert meeting.reconnects >= 9
+    assert backoffs == []